@@ -0,0 +1,276 @@
+"""Editor benchmarks on synthetic maps
+
+Runs headless on the offscreen Qt platform. Every map size is measured in its
+own process, so the reported peak memory belongs to that size alone.
+
+    python benchmarks/bench_editor.py
+    python benchmarks/bench_editor.py --sizes 100 1000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_editor.py --baseline benchmarks/baseline.json
+
+With --baseline the run exits with status 1 if any operation got slower than
+the baseline by more than the tolerance.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = [100, 250, 500, 1000]
+EDIT_COUNT = 1000
+VIEW_SIZE = (1280, 720)
+
+def peak_rss_mb():
+    """Peak resident memory of this process, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def best_ms(func, repeat: int = 3) -> float:
+    """Fastest of several runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def once_ms(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+def make_tileset(path: Path, pixels: int, seed: int = 0):
+    """Write a tileset image with varied tiles, so caches and PNG decoding do real work"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:pixels, 0:pixels]
+    rgba = np.empty((pixels, pixels, 4), dtype=np.uint8)
+    rgba[..., 0] = xs * 255 // pixels
+    rgba[..., 1] = ys * 255 // pixels
+    rgba[..., 2] = rng.integers(0, 64, (pixels, pixels))
+    rgba[..., 3] = 255
+    Image.fromarray(rgba, "RGBA").save(path)
+
+def make_project(size: int, layer_count: int, tile_ids: list, seed: int = 0) -> dict:
+    """Synthetic project: a full ground layer plus sparser upper layers and some entities"""
+    import numpy as np
+    from core.tile_layer import TileLayer, TileIdPalette, EMPTY_TILE, TILE_DTYPE
+    from core.entity_system import EntitySystem
+    
+    rng = np.random.default_rng(seed)
+    palette = TileIdPalette()
+    ids = np.array([palette.id_for(tile_id) for tile_id in tile_ids], dtype=TILE_DTYPE)
+    layers = []
+    for index in range(layer_count):
+        layer = TileLayer(f"Layer {index}", size, size)
+        tiles = rng.choice(ids, (size, size))
+        if index > 0:
+            tiles[rng.random((size, size)) > 0.25] = EMPTY_TILE
+        layer.set_region(0, 0, tiles)
+        layers.append(layer)
+    
+    entities = EntitySystem()
+    count = size * size // 100
+    entities.create_entities([f"entity_{i}" for i in range(count)],
+                             rng.random(count) * size * 32, rng.random(count) * size * 32)
+    return {
+        "name": f"bench_{size}",
+        "width": size,
+        "height": size,
+        "tile_size": 32,
+        "palette": palette,
+        "layers": layers,
+        "entities": entities
+    }
+
+def run_size(size: int, layer_count: int, tileset_pixels: int) -> dict:
+    """Measure every operation on one map size; runs inside a fresh process"""
+    import numpy as np
+    from PyQt6.QtWidgets import QApplication
+    from core.tile_manager import TileManager
+    from core.project_manager import ProjectManager
+    from core.autosave import AutosaveService
+    from ui.map_viewport import MapViewport
+    
+    app = QApplication.instance() or QApplication([])
+    ops = {}
+    
+    # Tilesets: registering only reads the header; the atlas is decoded on first use
+    tiles_dir = Path("assets/tiles")
+    tiles_dir.mkdir(parents=True, exist_ok=True)
+    tileset_path = tiles_dir / "bench.png"
+    make_tileset(tileset_path, tileset_pixels)
+    tile_manager = TileManager()
+    ops["load_tileset"] = once_ms(lambda: tile_manager.load_tileset("bench.png", str(tileset_path), 32))
+    ops["load_atlas_cold"] = once_ms(lambda: tile_manager.load_atlas("bench.png"))
+    cached = TileManager()
+    tile_ids = cached.load_tileset("bench.png", str(tileset_path), 32)
+    ops["load_atlas_cached"] = once_ms(lambda: cached.load_atlas("bench.png"))
+    
+    project = make_project(size, layer_count, tile_ids)
+    project_path = Path("assets/projects") / f"bench_{size}.h2d"
+    writer = ProjectManager()
+    ops["save_project"] = once_ms(lambda: writer.save_project(project, project_path))
+    writer.close_reader()
+    del project
+    
+    project_manager = ProjectManager()
+    ops["load_project"] = best_ms(lambda: project_manager.load_project(str(project_path)))
+    project = project_manager.current_project
+    autosave = AutosaveService(project_manager)
+    autosave.reset(project)
+    
+    view = MapViewport()
+    view.resize(*VIEW_SIZE)
+    view.chunk_cache.tile_source = tile_manager.get_tile_by_id
+    
+    def complete_frames():
+        """Paint until no chunk is left waiting on the per-frame render budget"""
+        view.grab()
+        while view.render_pending:
+            view.grab()
+    
+    ops["viewport_load_and_first_frame"] = once_ms(lambda: (view.load_project(project), view.grab()))
+    ops["viewport_fit_complete"] = once_ms(complete_frames)
+    ops["draw_grid_fit"] = best_ms(lambda: (view.draw_grid(), view.grab()))
+    view.resetTransform()
+    view.centerOn(size * 16, size * 16)
+    complete_frames()
+    ops["draw_grid_1x"] = best_ms(lambda: (view.draw_grid(), view.grab()))
+    # Zooming out across a level of detail renders every visible chunk again
+    view.scale(0.3, 0.3)
+    ops["zoom_lod_change"] = once_ms(complete_frames)
+    view.resetTransform()
+    view.centerOn(size * 16, size * 16)
+    complete_frames()
+    
+    # Per-call editing costs, in milliseconds per call
+    rng = np.random.default_rng(1)
+    coords = rng.integers(0, size, (EDIT_COUNT, 2)).tolist()
+    view.set_current_layer(1 if len(project["layers"]) > 1 else 0)
+    picks = [tile_ids[i] for i in rng.integers(0, len(tile_ids), EDIT_COUNT)]
+    ops["place_tile"] = once_ms(lambda: [view.place_tile(x, y, t) for (x, y), t in zip(coords, picks)]) / EDIT_COUNT
+    ops["erase_tile"] = once_ms(lambda: [view.erase_tile(x, y) for x, y in coords]) / EDIT_COUNT
+    view.set_selected_tile(tile_ids[0])
+    ops["flood_fill"] = once_ms(lambda: view.flood_fill(0, 0))
+    
+    # What Ctrl+S runs: journal the chunks touched by the edits above, waiting for the write
+    ops["autosave_save_flush"] = once_ms(lambda: (autosave.save(), autosave.flush()))
+    project_manager.close_reader()
+    
+    return {
+        "size": size,
+        "layers": layer_count,
+        "tileset_pixels": tileset_pixels,
+        "ops_ms": ops,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def run_isolated(size: int, layer_count: int, tileset_pixels: int) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir:
+        command = [sys.executable, str(Path(__file__).resolve()), "--single", str(size),
+                   "--layers", str(layer_count), "--tileset", str(tileset_pixels)]
+        output = subprocess.run(command, cwd=work_dir, capture_output=True, text=True)
+        if output.returncode != 0:
+            raise RuntimeError(f"benchmark for {size}x{size} failed:\n{output.stderr}")
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float) -> list:
+    """Operations slower than the baseline by more than tolerance (and min_ms)"""
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if base is None:
+            continue
+        if (base["layers"], base["tileset_pixels"]) != (result["layers"], result["tileset_pixels"]):
+            print(f"{size}x{size}: baseline used different layers or tileset size, not compared", file=sys.stderr)
+            continue
+        for op, ms in result["ops_ms"].items():
+            base_ms = base["ops_ms"].get(op)
+            if base_ms is None:
+                continue
+            if ms > base_ms * (1 + tolerance) and ms - base_ms > min_ms:
+                regressions.append((size, op, base_ms, ms))
+    return regressions
+
+def print_table(results: dict, baseline: dict = None):
+    ops = sorted({op for result in results.values() for op in result["ops_ms"]})
+    sizes = list(results)
+    print(f"{'operation (ms)':<32}" + "".join(f"{size + 'x' + size:>16}" for size in sizes))
+    for op in ops:
+        row = f"{op:<32}"
+        for size in sizes:
+            ms = results[size]["ops_ms"].get(op)
+            cell = "-" if ms is None else f"{ms:.3f}"
+            base = (baseline or {}).get(size, {}).get("ops_ms", {}).get(op)
+            if ms is not None and base:
+                cell += f" ({ms / base:.2f}x)"
+            row += f"{cell:>16}"
+        print(row)
+    peaks = [results[size]["peak_rss_mb"] for size in sizes]
+    print(f"{'peak memory (MB)':<32}" + "".join(f"{'-' if p is None else f'{p:.0f}':>16}" for p in peaks))
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Benchmark editor operations on synthetic maps")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="map widths (maps are square)")
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--tileset", type=int, default=2048, help="tileset image size in pixels")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.single:
+        print(json.dumps(run_size(args.single, args.layers, args.tileset)))
+        return
+    
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking {size}x{size}...", file=sys.stderr)
+        results[str(size)] = run_isolated(size, args.layers, args.tileset)
+    
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+    
+    print_table(results, baseline)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+    
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        for size, op, base_ms, ms in regressions:
+            print(f"REGRESSION {size}x{size} {op}: {base_ms:.3f} ms -> {ms:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Incremental project saving through an append-only journal
+
+Each save appends the chunks and entities that changed (and the project
+metadata, if it changed) to "<project>.h2d.journal", followed by a commit
+record. Records
+carry a CRC, so a batch torn by a crash is ignored on replay. When the
+journal grows large it is merged into the binary project file, which is
+rewritten atomically and the journal removed.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from pathlib import Path
+from .tile_layer import TileLayer, TileChunk, TileIdPalette, TILE_DTYPE
+from .entity_system import Entity, EntitySystem
+from . import h2d_format
+from .h2d_format import ChunkRef, H2DReader, DISK_DTYPE
+from .profiler import profiled
+
+JOURNAL_SUFFIX = ".journal"
+RECORD = struct.Struct("<BII")      # record type, payload length, crc32
+CHUNK_KEY = struct.Struct("<HiiB")  # layer index, cx, cy, empty flag
+
+REC_META = 1
+REC_CHUNK = 2
+REC_COMMIT = 3
+REC_ENTITY = 4          # one entity as JSON, replacing any entity with its id
+REC_ENTITY_REMOVED = 5  # id of a removed entity
+
+def journal_path(project_path: str) -> str:
+    return f"{project_path}{JOURNAL_SUFFIX}"
+
+def read_journal(path: str):
+    """Read the committed state of a journal
+    
+    Returns (meta, chunks, entities, valid_length) where meta is the latest
+    metadata dict or None, chunks maps (layer, cx, cy) to zlib data (None for
+    emptied chunks), entities maps ids to entity dicts (None for removed ones)
+    and valid_length is the offset just past the last complete commit.
+    """
+    meta, chunks, entities, valid_length = None, {}, {}, 0
+    if not os.path.exists(path):
+        return meta, chunks, entities, valid_length
+    
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    pos = 0
+    batch_meta, batch_chunks, batch_entities = None, {}, {}
+    while pos + RECORD.size <= len(data):
+        rec_type, length, crc = RECORD.unpack_from(data, pos)
+        payload = data[pos + RECORD.size:pos + RECORD.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        pos += RECORD.size + length
+        
+        if rec_type == REC_META:
+            batch_meta = json.loads(payload.decode("utf-8"))
+        elif rec_type == REC_CHUNK:
+            layer, cx, cy, empty = CHUNK_KEY.unpack_from(payload, 0)
+            batch_chunks[(layer, cx, cy)] = None if empty else payload[CHUNK_KEY.size:]
+        elif rec_type == REC_ENTITY:
+            entity = json.loads(payload.decode("utf-8"))
+            batch_entities[entity["id"]] = entity
+        elif rec_type == REC_ENTITY_REMOVED:
+            batch_entities[payload.decode("utf-8")] = None
+        elif rec_type == REC_COMMIT:
+            if batch_meta is not None:
+                meta = batch_meta
+            chunks.update(batch_chunks)
+            entities.update(batch_entities)
+            batch_meta, batch_chunks, batch_entities = None, {}, {}
+            valid_length = pos
+        else:
+            break
+    return meta, chunks, entities, valid_length
+
+def decode_chunk(data: bytes, size: int) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(data), dtype=DISK_DTYPE).reshape(size, size).astype(TILE_DTYPE)
+
+def apply_meta(project: dict, meta: dict):
+    """Apply journaled metadata to a live project, creating or dropping layers to match"""
+    for key, value in meta.items():
+        if key not in ("format_version", "layers", "palette", "entities"):
+            project[key] = value
+    project["palette"] = TileIdPalette.from_list(meta.get("palette", []))
+    if "entities" in meta:
+        # Journals written before per-entity records carried the whole list
+        project["entities"] = EntitySystem.deserialize(meta["entities"])
+    
+    layers = project["layers"]
+    del layers[len(meta["layers"]):]
+    for i, layer_meta in enumerate(meta["layers"]):
+        if i == len(layers):
+            layers.append(TileLayer(layer_meta["name"], project["width"], project["height"], layer_meta["chunk_size"]))
+        layers[i].name = layer_meta["name"]
+        layers[i].visible = layer_meta.get("visible", True)
+        layers[i].parallax = layer_meta.get("parallax", 100)
+
+def replay_journal(project: dict, project_path: str) -> bool:
+    """Recover committed journal changes into a freshly loaded project"""
+    meta, chunks, entity_changes, _ = read_journal(journal_path(project_path))
+    if meta is None and not chunks and not entity_changes:
+        return False
+    
+    if meta is not None:
+        apply_meta(project, meta)
+    layers = project["layers"]
+    for (layer_index, cx, cy), data in chunks.items():
+        if layer_index >= len(layers):
+            continue
+        layer = layers[layer_index]
+        if data is None:
+            layer.chunks.pop((cx, cy), None)
+        else:
+            layer.chunks[(cx, cy)] = TileChunk(layer.chunk_size, decode_chunk(data, layer.chunk_size))
+    
+    apply_entity_changes(project["entities"], entity_changes)
+    return True
+
+def apply_entity_changes(entities: EntitySystem, entity_changes: dict):
+    """Apply journaled entity records (entity dicts, None for removed ids) as already saved"""
+    for entity_id in entity_changes:
+        entities.remove_entity(entity_id)
+    entities.add_entities([Entity.from_dict(data) for data in entity_changes.values() if data is not None])
+    entities.dirty_ids.clear()
+
+def compact(project_manager, project: dict, project_path: str) -> int:
+    """Merge the journal into the binary project file and remove the journal
+    
+    Unchanged chunks are copied byte-for-byte from the old file and journaled
+    chunks are written as stored, so nothing is recompressed. Lazy chunks of
+    the live project are re-pointed at the new file. Returns bytes written.
+    """
+    path = Path(project_path)
+    jpath = journal_path(project_path)
+    meta, chunks, entity_changes, _ = read_journal(jpath)
+    
+    base = H2DReader(path)
+    header = dict(meta) if meta is not None else dict(base.header)
+    header["format_version"] = h2d_format.FORMAT_VERSION
+    header["entities"] = header.get("entities", base.header.get("entities", []))
+    if entity_changes:
+        entities = EntitySystem.deserialize(header["entities"])
+        apply_entity_changes(entities, entity_changes)
+        header["entities"] = entities.serialize()
+    base_layers = base.header.get("layers", [])
+    tmp_path = path.with_name(path.name + ".tmp")
+    
+    layer_keys = {}
+    for (layer_index, cx, cy), data in chunks.items():
+        layer_keys.setdefault(layer_index, set()).add((cx, cy))
+    
+    new_index = []
+    with open(tmp_path, 'wb') as f:
+        f.write(h2d_format.PREAMBLE.pack(h2d_format.MAGIC, h2d_format.FORMAT_VERSION, 0, 0, 0))
+        offset = 0
+        layers = []
+        for i, layer_meta in enumerate(header["layers"]):
+            base_chunks = {}
+            if i < len(base_layers):
+                base_chunks = {(c[0], c[1]): c for c in base_layers[i]["chunks"]}
+            
+            index, lookup = [], {}
+            for key in sorted(set(base_chunks) | layer_keys.get(i, set())):
+                if (i,) + key in chunks:
+                    data, codec = chunks[(i,) + key], "zlib"
+                    if data is None:
+                        continue
+                else:
+                    _, _, base_offset, length, codec = base_chunks[key]
+                    data = base.read_bytes(base_offset, length)
+                f.write(data)
+                entry = [key[0], key[1], offset, len(data), codec]
+                index.append(entry)
+                lookup[key] = entry
+                offset += len(data)
+            
+            layer_header = {k: v for k, v in layer_meta.items() if k != "chunks"}
+            layer_header["chunks"] = index
+            layers.append(layer_header)
+            new_index.append(lookup)
+        header["layers"] = layers
+        h2d_format.finish_file(f, header, offset)
+    written = os.path.getsize(tmp_path)
+    
+    with h2d_format.IO_LOCK:
+        base.close()
+        project_manager.close_reader()
+        os.replace(tmp_path, path)
+        os.remove(jpath)
+        
+        new_reader = H2DReader(path)
+        for layer, lookup in zip(project["layers"], new_index):
+            for key, chunk in list(layer.chunks.items()):
+                ref = chunk.loader
+                if isinstance(ref, ChunkRef) and key in lookup:
+                    _, _, ref.offset, ref.length, ref.codec = lookup[key]
+                    ref.reader = new_reader
+        project_manager.reader = new_reader
+    return written
+
+class AutosaveService:
+    """Saves only what changed since the last save, on a background worker thread
+    
+    snapshot work (copying dirty chunk arrays and changed entity dicts) happens
+    on the calling thread and takes milliseconds; encoding, compression and
+    disk I/O happen on the worker.
+    on_saved is called from the worker thread with a result dict.
+    """
+    
+    def __init__(self, project_manager, on_saved=None, compact_bytes: int = 64 * 1024 * 1024):
+        self.project_manager = project_manager
+        self.on_saved = on_saved
+        self.compact_bytes = compact_bytes
+        self.last_meta_state = None
+        self.layer_ids = []
+        self.entities_id = None
+        self.journal_lengths = {}  # journal path -> offset past its last commit
+        
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.worker.start()
+    
+    def reset(self, project: dict):
+        """Treat the project's current state as saved (after load or a full save)"""
+        self.last_meta_state = self.meta_state(project)
+        self.layer_ids = [id(layer) for layer in project["layers"]]
+        self.entities_id = id(project["entities"])
+        project["entities"].dirty_ids.clear()
+        # A full save removes the journal, so remembered lengths no longer apply
+        self.journal_lengths.clear()
+        for layer in project["layers"]:
+            layer.mark_clean()
+    
+    @staticmethod
+    def meta_state(project: dict) -> str:
+        """Metadata without entities; those are journaled one by one from EntitySystem.dirty_ids"""
+        header = h2d_format.project_header(project, include_entities=False)
+        return json.dumps(header, separators=(",", ":"))
+    
+    @profiled()
+    def save(self, project: dict = None) -> bool:
+        """Snapshot pending changes and queue them for writing; returns False if nothing changed"""
+        started = time.perf_counter()
+        project = project or self.project_manager.current_project
+        path = self.project_manager.current_path
+        if project is None or path is None:
+            return False
+        
+        layer_ids = [id(layer) for layer in project["layers"]]
+        if (layer_ids[:len(self.layer_ids)] != self.layer_ids or id(project["entities"]) != self.entities_id
+                or not os.path.exists(path) or not h2d_format.is_binary_project(path)):
+            # Layers were removed or reordered, the entity system was replaced,
+            # or there is no binary base to journal against
+            return self.save_full(project, path, started)
+        
+        meta_state = self.meta_state(project)
+        meta = meta_state.encode("utf-8") if meta_state != self.last_meta_state else None
+        chunks = []
+        for layer_index, layer in enumerate(project["layers"]):
+            for (cx, cy), chunk in layer.chunks.items():
+                if chunk.dirty:
+                    chunks.append((layer_index, cx, cy, chunk.tiles.copy()))
+                    chunk.dirty = False
+        # Only copies the changed entities' dicts; JSON encoding happens on the worker
+        entities, removed = project["entities"].take_changes()
+        if meta is None and not chunks and not entities and not removed:
+            return False
+        
+        job = {
+            "project": project,
+            "path": path,
+            "meta": meta,
+            "chunks": chunks,
+            "entities": entities,
+            "removed": removed,
+            "started": started,
+            "snapshot_ms": (time.perf_counter() - started) * 1000
+        }
+        self.last_meta_state = meta_state
+        self.layer_ids = layer_ids
+        self.jobs.put(job)
+        return True
+    
+    def save_full(self, project: dict, path: str, started: float) -> bool:
+        """Rewrite the whole project file; used when the journal can't describe the change"""
+        self.flush()
+        self.project_manager.save_project(project, path)
+        self.journal_lengths.pop(journal_path(path), None)
+        written = os.path.getsize(path)
+        self.reset(project)
+        self.report({
+            "bytes": written,
+            "chunks": sum(len(layer.chunks) for layer in project["layers"]),
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "snapshot_ms": (time.perf_counter() - started) * 1000,
+            "compacted": True,
+            "error": None
+        })
+        return True
+    
+    def flush(self):
+        """Block until every queued save has been written"""
+        self.jobs.join()
+    
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                result = self.write(job)
+            except Exception as e:
+                # Any failure must leave the worker alive, or flush() would block forever
+                self.retry_later(job)
+                result = {"bytes": 0, "chunks": 0, "latency_ms": 0, "snapshot_ms": job["snapshot_ms"],
+                          "compacted": False, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                self.jobs.task_done()
+            try:
+                self.report(result)
+            except Exception:
+                pass
+    
+    def retry_later(self, job: dict):
+        """Mark a failed batch's chunks, entities and metadata unsaved so the next save writes them again"""
+        self.journal_lengths.pop(journal_path(job["path"]), None)
+        self.last_meta_state = None
+        layers = job["project"]["layers"]
+        for layer_index, cx, cy, _ in job["chunks"]:
+            if layer_index < len(layers):
+                chunk = layers[layer_index].chunks.get((cx, cy))
+                if chunk is not None:
+                    chunk.dirty = True
+        dirty_ids = job["project"]["entities"].dirty_ids
+        dirty_ids.update(data["id"] for data in job["entities"])
+        dirty_ids.update(job["removed"])
+    
+    @profiled()
+    def write(self, job: dict) -> dict:
+        """Append one committed batch to the journal, compacting it if it grew too large"""
+        jpath = journal_path(job["path"])
+        valid_length = self.journal_lengths.get(jpath)
+        # Never trust a remembered length the file no longer has; truncating up would pad it with zeros
+        if valid_length is None or not os.path.exists(jpath) or os.path.getsize(jpath) < valid_length:
+            valid_length = read_journal(jpath)[3]
+        records = []
+        if job["meta"] is not None:
+            records.append((REC_META, job["meta"]))
+        for layer_index, cx, cy, tiles in job["chunks"]:
+            empty = not tiles.any()
+            payload = CHUNK_KEY.pack(layer_index, cx, cy, empty)
+            if not empty:
+                payload += zlib.compress(tiles.astype(DISK_DTYPE).tobytes(), 1)
+            records.append((REC_CHUNK, payload))
+        for data in job["entities"]:
+            records.append((REC_ENTITY, json.dumps(data, separators=(",", ":")).encode("utf-8")))
+        for entity_id in job["removed"]:
+            records.append((REC_ENTITY_REMOVED, entity_id.encode("utf-8")))
+        records.append((REC_COMMIT, struct.pack("<d", time.time())))
+        
+        written = 0
+        with open(jpath, 'ab') as f:
+            # Drop a torn tail left by an interrupted write before appending
+            f.truncate(valid_length)
+            f.seek(valid_length)
+            for rec_type, payload in records:
+                f.write(RECORD.pack(rec_type, len(payload), zlib.crc32(payload)))
+                f.write(payload)
+                written += RECORD.size + len(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            journal_size = f.tell()
+        self.journal_lengths[jpath] = journal_size
+        
+        compacted = False
+        if journal_size > self.compact_bytes:
+            written += compact(self.project_manager, job["project"], job["path"])
+            self.journal_lengths[jpath] = 0
+            compacted = True
+        
+        return {
+            "bytes": written,
+            "chunks": len(job["chunks"]),
+            "latency_ms": (time.perf_counter() - job["started"]) * 1000,
+            "snapshot_ms": job["snapshot_ms"],
+            "compacted": compacted,
+            "error": None
+        }
+    
+    def report(self, result: dict):
+        if self.on_saved is not None:
+            self.on_saved(result)
@@ -0,0 +1,289 @@
+"""Headless baking of projects into runtime assets
+
+For every project this writes, under <out>/<project file stem>/:
+    chunks/<cx>_<cy>.png   visible layers flattened into one image per chunk
+    collision.png          one pixel per cell, 255 where a collidable entity stands
+    entities.json          entity manifest, with the chunk each entity falls in
+    bake.json              content hash of every baked chunk
+
+Decoded tilesets are cached in <out>/.cache/tiles, shared by every project.
+
+Chunks are rendered in a process pool. A chunk is only re-rendered when the
+hash of its tile ids, the pixels of the tiles it uses and the bake settings
+changes, so rebaking an untouched project costs little more than loading it.
+No Qt is needed; tiles are read with PIL/NumPy through TileManager.
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from PIL import Image
+from .entity_system import DEFAULT_PROPERTIES
+from .tile_layer import CHUNK_SIZE, EMPTY_TILE
+from .tile_manager import TileManager
+from .project_manager import ProjectManager
+
+BAKE_VERSION = 1
+INDEX_FILE = "bake.json"
+
+class TileTable:
+    """Pixels and content digests of palette tiles, resolved once per project"""
+    
+    def __init__(self, palette, tile_manager: TileManager, tiles_dir: Path, tile_size: int):
+        self.palette = palette
+        self.tile_manager = tile_manager
+        self.tiles_dir = tiles_dir
+        self.tile_size = tile_size
+        self.pixels = {}
+        self.digests = {}
+        self.atlases = {}  # tileset name -> decoded pixels, or None if it can't be used
+        self.missing = set()
+    
+    def tile(self, tile_id: int) -> np.ndarray:
+        pixels = self.pixels.get(tile_id)
+        if pixels is None:
+            pixels = self.pixels[tile_id] = self.resolve(tile_id)
+            self.digests[tile_id] = hashlib.sha1(pixels.tobytes()).digest()
+        return pixels
+    
+    def digest(self, tile_id: int) -> bytes:
+        self.tile(tile_id)
+        return self.digests[tile_id]
+    
+    def resolve(self, tile_id: int) -> np.ndarray:
+        """Cut a tile out of its tileset; unknown tiles bake as transparent"""
+        ts = self.tile_size
+        empty = np.zeros((ts, ts, 4), dtype=np.uint8)
+        key = self.palette.key_for(tile_id) if tile_id != EMPTY_TILE else None
+        parsed = TileManager.split_tile_id(key)
+        if parsed is None:
+            if key is not None:
+                self.missing.add(key)
+            return empty
+        
+        name, x, y = parsed
+        atlas = self.atlas(name)
+        if atlas is None:
+            self.missing.add(key)
+            return empty
+        block = atlas[y:y + ts, x:x + ts]
+        if block.shape[:2] != (ts, ts):
+            self.missing.add(key)
+            return empty
+        return np.ascontiguousarray(block)
+    
+    def atlas(self, name: str) -> np.ndarray:
+        """Decoded pixels of a tileset, read once per table however many tiles it supplies"""
+        if name in self.atlases:
+            return self.atlases[name]
+        info = self.tile_manager.tilesets.get(name)
+        if info is None or info["tile_size"] != self.tile_size:
+            path = self.tiles_dir / name
+            if not path.exists():
+                self.atlases[name] = None
+                return None
+            self.tile_manager.load_tileset(name, str(path), self.tile_size)
+        atlas = self.atlases[name] = self.tile_manager.load_pixels(name)
+        return atlas
+
+def render_chunk(task) -> str:
+    """Flatten one chunk's layers into a PNG (runs in a worker process)"""
+    out_path, layer_blocks, tiles, png_level = task
+    ts = tiles.shape[1]
+    h, w = layer_blocks[0].shape
+    image = None
+    for block in layer_blocks:
+        # Gather every cell's tile at once, then lay the tiles out row by row
+        pixels = tiles[block].transpose(0, 2, 1, 3, 4).reshape(h * ts, w * ts, 4)
+        layer_image = Image.fromarray(pixels, "RGBA")
+        image = layer_image if image is None else Image.alpha_composite(image, layer_image)
+    
+    tmp_path = f"{out_path}.tmp"
+    image.save(tmp_path, format="PNG", compress_level=png_level)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Write a file only when its content differs, keeping timestamps of unchanged outputs"""
+    if path.exists() and path.read_bytes() == data:
+        return False
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return True
+
+def collision_mask(project: dict, columns: dict) -> np.ndarray:
+    """Cells covered by collidable entities, from EntitySystem.serialize() columns"""
+    tile_size = project.get("tile_size", 32)
+    mask = np.zeros((project["height"], project["width"]), dtype=np.uint8)
+    properties = columns["properties"]
+    collidable = np.array([bool(properties.get(entity_id, DEFAULT_PROPERTIES).get("collidable"))
+                           for entity_id in columns["id"]], dtype=bool)
+    xs = np.floor_divide(np.array(columns["x"], dtype=np.float64)[collidable], tile_size).astype(np.int64)
+    ys = np.floor_divide(np.array(columns["y"], dtype=np.float64)[collidable], tile_size).astype(np.int64)
+    inside = (xs >= 0) & (xs < project["width"]) & (ys >= 0) & (ys < project["height"])
+    mask[ys[inside], xs[inside]] = 255
+    return mask
+
+def entity_manifest(project: dict, columns: dict, chunk_size: int) -> dict:
+    """Per-entity manifest records, sorted by id, built from EntitySystem.serialize() columns"""
+    tile_size = project.get("tile_size", 32)
+    span = chunk_size * tile_size
+    chunk_xs = np.floor_divide(np.array(columns["x"], dtype=np.float64), span).astype(np.int64).tolist()
+    chunk_ys = np.floor_divide(np.array(columns["y"], dtype=np.float64), span).astype(np.int64).tolist()
+    properties, components = columns["properties"], columns["components"]
+    entities = [
+        {
+            "id": entity_id,
+            "name": name,
+            "x": x,
+            "y": y,
+            "type": entity_type,
+            "properties": properties.get(entity_id, DEFAULT_PROPERTIES),
+            "components": components.get(entity_id, {}),
+            "chunk": [cx, cy]
+        }
+        for entity_id, name, x, y, entity_type, cx, cy in sorted(zip(
+            columns["id"], columns["name"], columns["x"], columns["y"], columns["type"], chunk_xs, chunk_ys))
+    ]
+    return {"name": project["name"], "tile_size": tile_size, "chunk_size": chunk_size, "entities": entities}
+
+def iter_chunks(project: dict, table: TileTable, chunk_size: int):
+    """Yield (key, hash, layer blocks, used tile ids) per non-empty chunk
+    
+    Blocks index into the used ids, so chunks with equal content hash equally.
+    """
+    layers = [layer for layer in project["layers"] if layer.visible]
+    settings = json.dumps([BAKE_VERSION, table.tile_size, chunk_size]).encode("utf-8")
+    
+    for y in range(0, project["height"], chunk_size):
+        for x in range(0, project["width"], chunk_size):
+            w, h = min(chunk_size, project["width"] - x), min(chunk_size, project["height"] - y)
+            blocks = [layer.get_region(x, y, w, h) for layer in layers]
+            blocks = [block for block in blocks if block.any()]
+            if not blocks:
+                continue
+            
+            used, local = np.unique(np.stack(blocks), return_inverse=True)
+            local = local.reshape(len(blocks), h, w).astype(np.uint16)
+            digest = hashlib.sha1(settings)
+            digest.update(local.tobytes())
+            for tile_id in used.tolist():
+                digest.update(table.digest(tile_id))
+            
+            yield f"{x // chunk_size}_{y // chunk_size}", digest.hexdigest(), local, used
+
+def bake_project(path: str, out_dir: str, pool: ProcessPoolExecutor, tiles_dir: str = "assets/tiles",
+                 chunk_size: int = CHUNK_SIZE, force: bool = False, png_level: int = 6,
+                 max_in_flight: int = 64) -> dict:
+    """Bake one project, rendering only chunks whose content hash changed"""
+    start = time.perf_counter()
+    project_manager = ProjectManager(projects_dir=None)
+    project = project_manager.load_project(path)
+    project.setdefault("name", Path(path).stem)
+    # Output folders follow file names, which are unique within a folder of projects
+    target = Path(out_dir) / Path(path).stem
+    chunks_dir = target / "chunks"
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    
+    index_path = target / INDEX_FILE
+    previous = {}
+    if index_path.exists() and not force:
+        with open(index_path, 'r') as f:
+            previous = json.load(f).get("chunks", {})
+    
+    # Decoded tilesets are cached under the output folder, never in the working directory
+    tile_manager = TileManager(assets_dir=None, cache_dir=str(Path(out_dir) / ".cache" / "tiles"))
+    table = TileTable(project["palette"], tile_manager, Path(tiles_dir), project.get("tile_size", 32))
+    hashes = {}
+    rendered = skipped = 0
+    in_flight = set()
+    for key, digest, blocks, used in iter_chunks(project, table, chunk_size):
+        hashes[key] = digest
+        out_path = chunks_dir / f"{key}.png"
+        if previous.get(key) == digest and out_path.exists():
+            skipped += 1
+            continue
+        # Keep a bounded number of chunks queued so large maps do not pile up in memory
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        tiles = np.stack([table.tile(tile_id) for tile_id in used.tolist()])
+        in_flight.add(pool.submit(render_chunk, (str(out_path), list(blocks), tiles, png_level)))
+        rendered += 1
+    for future in in_flight:
+        future.result()
+    project_manager.close_reader()
+    
+    # Chunks that became empty since the last bake
+    removed = 0
+    for key in set(previous) - set(hashes):
+        stale = chunks_dir / f"{key}.png"
+        if stale.exists():
+            stale.unlink()
+            removed += 1
+    
+    columns = project["entities"].serialize()
+    buffer = io.BytesIO()
+    Image.fromarray(collision_mask(project, columns), "L").save(buffer, format="PNG")
+    write_if_changed(target / "collision.png", buffer.getvalue())
+    manifest = entity_manifest(project, columns, chunk_size)
+    write_if_changed(target / "entities.json", json.dumps(manifest, indent=2).encode("utf-8"))
+    write_if_changed(index_path, json.dumps({"version": BAKE_VERSION, "chunks": hashes}, indent=2).encode("utf-8"))
+    
+    return {
+        "project": project["name"],
+        "rendered": rendered,
+        "skipped": skipped,
+        "removed": removed,
+        "missing_tiles": sorted(table.missing),
+        "seconds": time.perf_counter() - start
+    }
+
+def find_projects(paths) -> list:
+    """Expand directories into the .h2d/.json projects they contain"""
+    projects = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            projects.extend(sorted(p for p in path.iterdir() if p.suffix in (".h2d", ".json")))
+        else:
+            projects.append(path)
+    return projects
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Bake HD2D projects into PNG chunks, collision masks and entity manifests")
+    parser.add_argument("projects", nargs="+", help="project files or folders of projects")
+    parser.add_argument("--out", default="build/baked")
+    parser.add_argument("--tiles", default="assets/tiles", help="folder containing the tileset images")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="chunk size in cells")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--png-level", type=int, default=6, choices=range(10), help="PNG compression level")
+    parser.add_argument("--force", action="store_true", help="re-render every chunk")
+    args = parser.parse_args()
+    
+    failed = False
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for path in find_projects(args.projects):
+            try:
+                result = bake_project(str(path), args.out, pool, args.tiles, args.chunk_size, args.force,
+                                      args.png_level, max_in_flight=4 * (args.jobs or 1))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"{path}: failed: {e}", file=sys.stderr)
+                failed = True
+                continue
+            print(f"{path.name}: {result['rendered']} rendered, {result['skipped']} unchanged, "
+                  f"{result['removed']} removed in {result['seconds']:.2f}s")
+            if result["missing_tiles"]:
+                print(f"  missing tiles: {', '.join(result['missing_tiles'][:10])}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import numpy as np
+from typing import Tuple
+from .tile_layer import TILE_DTYPE, EMPTY_TILE
+
+def rect_mask(w: int, h: int) -> np.ndarray:
+    return np.ones((max(h, 0), max(w, 0)), dtype=bool)
+
+def ellipse_mask(w: int, h: int) -> np.ndarray:
+    """Cells whose centres fall inside the ellipse inscribed in a w x h box"""
+    ys, xs = np.ogrid[0:max(h, 0), 0:max(w, 0)]
+    rx, ry = w / 2, h / 2
+    return ((xs + 0.5 - rx) / rx) ** 2 + ((ys + 0.5 - ry) / ry) ** 2 <= 1.0
+
+def line_cells(x0: int, y0: int, x1: int, y1: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cells of a Bresenham line from (x0, y0) to (x1, y1), both ends included"""
+    dx, dy = x1 - x0, y1 - y0
+    n = max(abs(dx), abs(dy))
+    if n == 0:
+        return np.array([x0]), np.array([y0])
+    # Integer rounding of the minor axis, matching Bresenham's error term
+    t = np.arange(n + 1)
+    xs = x0 + np.sign(dx) * ((2 * t * abs(dx) + n) // (2 * n))
+    ys = y0 + np.sign(dy) * ((2 * t * abs(dy) + n) // (2 * n))
+    return xs, ys
+
+def polyline_cells(points) -> Tuple[np.ndarray, np.ndarray]:
+    """Cells of connected line segments through a list of (x, y) points"""
+    if len(points) == 1:
+        return line_cells(*points[0], *points[0])
+    segments = [line_cells(*a, *b) for a, b in zip(points, points[1:])]
+    return np.concatenate([s[0] for s in segments]), np.concatenate([s[1] for s in segments])
+
+def flood_fill_mask(tiles: np.ndarray, x: int, y: int) -> np.ndarray:
+    """4-connected region of cells sharing the id at (x, y)
+    
+    Rows are split into runs of matching cells and runs touching across rows
+    are joined with a vectorized union-find, so no Python loop visits cells.
+    """
+    h, w = tiles.shape
+    match = tiles == tiles[y, x]
+    
+    # Run starts and (exclusive) ends, ordered by row then column
+    edges = np.diff(np.pad(match, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]
+    
+    # Runs of the next row overlapping each run form one contiguous slice
+    stride = w + 2
+    start_keys = run_rows * stride + run_starts
+    end_keys = run_rows * stride + run_ends
+    below = (run_rows + 1) * stride
+    lo = np.searchsorted(end_keys, below + run_starts, side="right")
+    hi = np.searchsorted(start_keys, below + run_ends, side="left")
+    counts = np.maximum(hi - lo, 0)
+    src = np.repeat(np.arange(len(run_rows)), counts)
+    dst = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Hook larger labels onto smaller ones, then flatten, until stable
+    labels = np.arange(len(run_rows))
+    while len(src):
+        a, b = labels[src], labels[dst]
+        if np.array_equal(a, b):
+            break
+        np.minimum.at(labels, np.maximum(a, b), np.minimum(a, b))
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+    
+    row_first = np.searchsorted(run_rows, y)
+    seed = row_first + np.searchsorted(run_ends[row_first:np.searchsorted(run_rows, y, side="right")], x, side="right")
+    selected = labels == labels[seed]
+    
+    # Paint the selected runs back into a mask with a cumulative sum per row
+    marks = np.zeros((h, w + 1), dtype=np.int32)
+    np.add.at(marks, (run_rows[selected], run_starts[selected]), 1)
+    np.add.at(marks, (run_rows[selected], run_ends[selected]), -1)
+    return np.cumsum(marks, axis=1)[:, :w] > 0
+
+def brush_pattern(size: int, tile_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Round brush of a single tile id as (ids, mask)"""
+    mask = ellipse_mask(size, size)
+    return np.where(mask, tile_id, EMPTY_TILE).astype(TILE_DTYPE), mask
+
+def stamp_pattern(xs: np.ndarray, ys: np.ndarray, ids: np.ndarray, mask: np.ndarray,
+                  width: int, height: int):
+    """Stamp a pattern with its top-left cell at every (xs, ys) position
+    
+    Returns (x, y, tiles, mask) for the bounding block of all stamps, clipped
+    to the map, ready for TileLayer.set_region; None if nothing lands on the map.
+    """
+    ph, pw = ids.shape
+    x0, y0 = max(int(xs.min()), 0), max(int(ys.min()), 0)
+    x1, y1 = min(int(xs.max()) + pw, width), min(int(ys.max()) + ph, height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    
+    block = np.zeros((y1 - y0, x1 - x0), dtype=TILE_DTYPE)
+    block_mask = np.zeros(block.shape, dtype=bool)
+    # One scatter per pattern cell, each covering every stamp position at once
+    for dy, dx in zip(*np.nonzero(mask)):
+        px, py = xs + dx, ys + dy
+        inside = (px >= x0) & (px < x1) & (py >= y0) & (py < y1)
+        px, py = px[inside] - x0, py[inside] - y0
+        block[py, px] = ids[dy, dx]
+        block_mask[py, px] = True
+    return x0, y0, block, block_mask
@@ -1,19 +1,125 @@
+import math
+import os
 import uuid
-from typing import Dict, List, Any
+import numpy as np
+from typing import Dict, List, Iterable, Iterator, Optional, Set, Tuple
+
+DEFAULT_PROPERTIES = {
+    "visible": True,
+    "collidable": False,
+    "layer": 1
+}
+
+class TrackedDict(dict):
+    """Dict that reports every write to the entity owning it"""
+    __slots__ = ("owner",)
+    
+    def __init__(self, owner: 'Entity', *args):
+        super().__init__(*args)
+        self.owner = owner
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.owner.changed()
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.owner.changed()
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.owner.changed()
+    
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+    
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self.owner.changed()
+        return value
+    
+    def popitem(self):
+        item = super().popitem()
+        self.owner.changed()
+        return item
+    
+    def clear(self):
+        super().clear()
+        self.owner.changed()
 
 class Entity:
-    def __init__(self, name: str, x: float, y: float, entity_type: str = "sprite"):
-        self.id = str(uuid.uuid4())[:8]
-        self.name = name
-        self.x = x
-        self.y = y
-        self.type = entity_type
-        self.components = {}
-        self.properties = {
-            "visible": True,
-            "collidable": False,
-            "layer": 1
-        }
+    # Slots plus lazily created dicts keep 100k+ entities small in memory
+    __slots__ = ("id", "_name", "_x", "_y", "_type", "_components", "_properties", "_system")
+    
+    def __init__(self, name: str, x: float, y: float, entity_type: str = "sprite", entity_id: str = None):
+        self.id = entity_id or str(uuid.uuid4())[:8]
+        self._name = name
+        self._x = x
+        self._y = y
+        self._type = entity_type
+        self._components = None
+        self._properties = None
+        self._system = None
+    
+    def changed(self):
+        """Let the owning system know this entity was edited, so the edit gets saved"""
+        if self._system is not None:
+            self._system.touch(self.id)
+    
+    @property
+    def name(self) -> str:
+        return self._name
+    
+    @name.setter
+    def name(self, value: str):
+        self._name = value
+        self.changed()
+    
+    @property
+    def type(self) -> str:
+        return self._type
+    
+    @type.setter
+    def type(self, value: str):
+        self._type = value
+        self.changed()
+    
+    @property
+    def x(self) -> float:
+        return self._x
+    
+    @x.setter
+    def x(self, value: float):
+        self.move_to(value, self._y)
+    
+    @property
+    def y(self) -> float:
+        return self._y
+    
+    @y.setter
+    def y(self, value: float):
+        self.move_to(self._x, value)
+    
+    def move_to(self, x: float, y: float):
+        """Move the entity, keeping its system's spatial index up to date"""
+        if self._system is not None:
+            self._system.move_entity(self.id, x, y)
+        else:
+            self._x, self._y = x, y
+    
+    @property
+    def properties(self) -> dict:
+        if self._properties is None:
+            self._properties = TrackedDict(self, DEFAULT_PROPERTIES)
+        return self._properties
+    
+    @property
+    def components(self) -> dict:
+        if self._components is None:
+            self._components = TrackedDict(self)
+        return self._components
     
     def add_component(self, component: 'Component'):
         self.components[component.name] = component
@@ -21,15 +127,28 @@ class Entity:
     def to_dict(self) -> dict:
         return {
             "id": self.id,
-            "name": self.name,
-            "x": self.x,
-            "y": self.y,
-            "type": self.type,
-            "properties": self.properties,
-            "components": {k: v.to_dict() for k, v in self.components.items()}
+            "name": self._name,
+            "x": self._x,
+            "y": self._y,
+            "type": self._type,
+            "properties": dict(self._properties if self._properties is not None else DEFAULT_PROPERTIES),
+            "components": {k: v.to_dict() for k, v in self._components.items()} if self._components else {}
         }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Entity':
+        entity = cls(data["name"], data["x"], data["y"], data.get("type", "sprite"), data.get("id"))
+        properties = data.get("properties")
+        if properties is not None and properties != DEFAULT_PROPERTIES:
+            entity._properties = TrackedDict(entity, properties)
+        components = data.get("components")
+        if components:
+            entity._components = TrackedDict(entity, {k: Component(k, v) for k, v in components.items()})
+        return entity
 
 class Component:
+    __slots__ = ("name", "data")
+    
     def __init__(self, name: str, data: dict):
         self.name = name
         self.data = data
@@ -37,24 +156,286 @@ class Component:
     def to_dict(self) -> dict:
         return self.data
 
+class SpatialGrid:
+    """Uniform grid bucketing entity ids by the cell containing their position"""
+    
+    def __init__(self, cell_size: float = 64.0):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[str]] = {}
+        self.bounds = None  # (min cx, min cy, max cx, max cy) ever occupied
+    
+    def cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+    
+    def insert(self, entity_id: str, x: float, y: float):
+        cell = self.cell_of(x, y)
+        self.cells.setdefault(cell, set()).add(entity_id)
+        self.extend_bounds(cell[0], cell[1], cell[0], cell[1])
+    
+    def extend_bounds(self, cx0: int, cy0: int, cx1: int, cy1: int):
+        if self.bounds is None:
+            self.bounds = (cx0, cy0, cx1, cy1)
+        else:
+            b = self.bounds
+            self.bounds = (min(b[0], cx0), min(b[1], cy0), max(b[2], cx1), max(b[3], cy1))
+    
+    def remove(self, entity_id: str, x: float, y: float):
+        cell = self.cell_of(x, y)
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.discard(entity_id)
+            if not bucket:
+                del self.cells[cell]
+    
+    def move(self, entity_id: str, old_x: float, old_y: float, x: float, y: float):
+        if self.cell_of(old_x, old_y) != self.cell_of(x, y):
+            self.remove(entity_id, old_x, old_y)
+            self.insert(entity_id, x, y)
+    
+    def ids_in_rect(self, x0: float, y0: float, x1: float, y1: float) -> Iterable[str]:
+        """Ids in every cell overlapping the rect; callers filter exact positions"""
+        cx0, cy0 = self.cell_of(x0, y0)
+        cx1, cy1 = self.cell_of(x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Huge rect over a sparse grid: walk occupied cells instead
+            for (cx, cy), bucket in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield from bucket
+            return
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    yield from bucket
+    
+    def ids_in_ring(self, center: Tuple[int, int], ring: int) -> Iterable[str]:
+        """Ids in the square ring of cells at Chebyshev distance `ring` from center"""
+        ccx, ccy = center
+        if ring == 0:
+            yield from self.cells.get(center, ())
+            return
+        for cx in range(ccx - ring, ccx + ring + 1):
+            yield from self.cells.get((cx, ccy - ring), ())
+            yield from self.cells.get((cx, ccy + ring), ())
+        for cy in range(ccy - ring + 1, ccy + ring):
+            yield from self.cells.get((ccx - ring, cy), ())
+            yield from self.cells.get((ccx + ring, cy), ())
+    
+    def max_ring(self, center: Tuple[int, int]) -> int:
+        """Ring beyond which no occupied cell exists"""
+        if not self.cells:
+            return -1
+        cx0, cy0, cx1, cy1 = self.bounds
+        return max(abs(cx0 - center[0]), abs(cx1 - center[0]), abs(cy0 - center[1]), abs(cy1 - center[1]))
+    
+    def min_ring(self, center: Tuple[int, int]) -> int:
+        """Ring before which no occupied cell exists"""
+        if not self.cells:
+            return 0
+        cx0, cy0, cx1, cy1 = self.bounds
+        return max(cx0 - center[0], center[0] - cx1, cy0 - center[1], center[1] - cy1, 0)
+    
+    def rings(self, center: Tuple[int, int]) -> Iterator[Tuple[int, Iterable[str]]]:
+        """(ring, ids) outward from center, skipping rings known to be empty"""
+        ring, last_ring = self.min_ring(center), self.max_ring(center)
+        while ring <= last_ring:
+            if 8 * ring > len(self.cells):
+                # Rings now span more cells than are occupied: group the occupied cells by ring instead
+                ccx, ccy = center
+                by_ring = {}
+                for (cx, cy), bucket in self.cells.items():
+                    cell_ring = max(abs(cx - ccx), abs(cy - ccy))
+                    if cell_ring >= ring:
+                        by_ring.setdefault(cell_ring, []).append(bucket)
+                for cell_ring in sorted(by_ring):
+                    yield cell_ring, (entity_id for bucket in by_ring[cell_ring] for entity_id in bucket)
+                return
+            yield ring, self.ids_in_ring(center, ring)
+            ring += 1
+
 class EntitySystem:
-    def __init__(self):
+    def __init__(self, cell_size: float = 64.0):
         self.entities: Dict[str, Entity] = {}
+        self.grid = SpatialGrid(cell_size)
+        self.revision = 0  # bumped on every change made through the system
+        self.dirty_ids: Set[str] = set()  # ids added, edited or removed since take_changes()
     
-    def create_entity(self, name: str, x: float, y: float, entity_type: str = "sprite") -> Entity:
-        entity = Entity(name, x, y, entity_type)
+    def new_id(self) -> str:
+        entity_id = str(uuid.uuid4())[:8]
+        while entity_id in self.entities:
+            entity_id = str(uuid.uuid4())[:8]
+        return entity_id
+    
+    def add_entity(self, entity: Entity) -> Entity:
+        if entity.id in self.entities:
+            entity.id = self.new_id()
+        entity._system = self
         self.entities[entity.id] = entity
+        self.grid.insert(entity.id, entity._x, entity._y)
+        self.dirty_ids.add(entity.id)
+        self.revision += 1
         return entity
     
+    def create_entity(self, name: str, x: float, y: float, entity_type: str = "sprite") -> Entity:
+        return self.add_entity(Entity(name, x, y, entity_type, self.new_id()))
+    
+    def create_entities(self, names: List[str], xs, ys, entity_type: str = "sprite") -> List[Entity]:
+        """Create many entities at once"""
+        random_hex = os.urandom(4 * len(names)).hex()
+        created = [
+            Entity(name, x, y, entity_type, random_hex[i * 8:i * 8 + 8])
+            for i, (name, x, y) in enumerate(zip(names, np.asarray(xs).tolist(), np.asarray(ys).tolist()))
+        ]
+        return self.add_entities(created)
+    
+    def add_entities(self, new_entities: List[Entity]) -> List[Entity]:
+        """Add many entities, bucketing them into the grid in one vectorized pass"""
+        if not new_entities:
+            return new_entities
+        cell_size = self.grid.cell_size
+        cxs = np.floor(np.fromiter((e._x for e in new_entities), np.float64, len(new_entities)) / cell_size)
+        cys = np.floor(np.fromiter((e._y for e in new_entities), np.float64, len(new_entities)) / cell_size)
+        cxs, cys = cxs.astype(np.int64).tolist(), cys.astype(np.int64).tolist()
+        
+        entities, cells = self.entities, self.grid.cells
+        for entity, cell in zip(new_entities, zip(cxs, cys)):
+            if entity.id in entities:
+                entity.id = self.new_id()
+            entity._system = self
+            entities[entity.id] = entity
+            bucket = cells.get(cell)
+            if bucket is None:
+                cells[cell] = bucket = set()
+            bucket.add(entity.id)
+        self.grid.extend_bounds(min(cxs), min(cys), max(cxs), max(cys))
+        self.dirty_ids.update(entity.id for entity in new_entities)
+        self.revision += 1
+        return new_entities
+    
     def get_entity(self, entity_id: str) -> Entity:
         return self.entities.get(entity_id)
     
+    def move_entity(self, entity_id: str, x: float, y: float):
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            return
+        self.grid.move(entity_id, entity._x, entity._y, x, y)
+        entity._x, entity._y = x, y
+        self.dirty_ids.add(entity_id)
+        self.revision += 1
+    
     def remove_entity(self, entity_id: str):
         if entity_id in self.entities:
-            del self.entities[entity_id]
+            entity = self.entities.pop(entity_id)
+            self.grid.remove(entity_id, entity._x, entity._y)
+            entity._system = None
+            self.dirty_ids.add(entity_id)
+            self.revision += 1
+    
+    def touch(self, entity_id: str):
+        """Record a change made directly to an entity's name, type, properties or components"""
+        self.dirty_ids.add(entity_id)
+        self.revision += 1
+    
+    def take_changes(self) -> Tuple[List[dict], List[str]]:
+        """Snapshot entities changed since the last call as (entity dicts, removed ids) and start over"""
+        changed, removed = [], []
+        entities = self.entities
+        for entity_id in self.dirty_ids:
+            entity = entities.get(entity_id)
+            if entity is None:
+                removed.append(entity_id)
+            else:
+                changed.append(entity.to_dict())
+        self.dirty_ids = set()
+        return changed, removed
     
     def get_all_entities(self) -> List[Entity]:
         return list(self.entities.values())
     
-    def serialize(self) -> list:
-        return [entity.to_dict() for entity in self.entities.values()]
+    def query_rect(self, x: float, y: float, width: float, height: float) -> List[Entity]:
+        """Entities whose position lies inside the rect"""
+        x1, y1 = x + width, y + height
+        entities = self.entities
+        found = []
+        for entity_id in self.grid.ids_in_rect(x, y, x1, y1):
+            entity = entities[entity_id]
+            if x <= entity._x <= x1 and y <= entity._y <= y1:
+                found.append(entity)
+        return found
+    
+    def query_point(self, x: float, y: float, radius: float = 0.0) -> List[Entity]:
+        """Entities within radius of a point, nearest first"""
+        r2 = radius * radius
+        hits = []
+        for entity in self.query_rect(x - radius, y - radius, 2 * radius, 2 * radius):
+            d2 = (entity._x - x) ** 2 + (entity._y - y) ** 2
+            if d2 <= r2:
+                hits.append((d2, entity))
+        hits.sort(key=lambda hit: hit[0])
+        return [entity for _, entity in hits]
+    
+    def nearest(self, x: float, y: float, max_distance: float = math.inf) -> Optional[Entity]:
+        """Nearest entity to a point, searching outward ring by ring"""
+        best, best_d2 = None, max_distance * max_distance
+        for ring, ids in self.grid.rings(self.grid.cell_of(x, y)):
+            # Anything in this ring or later ones is at least this far away
+            reach = max(ring - 1, 0) * self.grid.cell_size
+            if reach * reach > best_d2:
+                break
+            for entity_id in ids:
+                entity = self.entities[entity_id]
+                d2 = (entity._x - x) ** 2 + (entity._y - y) ** 2
+                if d2 <= best_d2:
+                    best, best_d2 = entity, d2
+        return best
+    
+    def serialize(self) -> dict:
+        """Entities as columns; properties and components are kept only where they differ from the defaults"""
+        entities = list(self.entities.values())
+        properties, components = {}, {}
+        for entity in entities:
+            if entity._properties is not None and entity._properties != DEFAULT_PROPERTIES:
+                properties[entity.id] = dict(entity._properties)
+            if entity._components:
+                components[entity.id] = {k: v.to_dict() for k, v in entity._components.items()}
+        return {
+            "id": [entity.id for entity in entities],
+            "name": [entity._name for entity in entities],
+            "x": [entity._x for entity in entities],
+            "y": [entity._y for entity in entities],
+            "type": [entity._type for entity in entities],
+            "properties": properties,
+            "components": components
+        }
+    
+    @classmethod
+    def deserialize(cls, data, cell_size: float = 64.0) -> 'EntitySystem':
+        """Rebuild a system from serialize() columns or, for older files, a list of entity dicts"""
+        if isinstance(data, list):
+            return cls.from_list(data, cell_size)
+        created = [
+            Entity(name, x, y, entity_type, entity_id)
+            for entity_id, name, x, y, entity_type in zip(data["id"], data["name"], data["x"], data["y"], data["type"])
+        ]
+        by_id = {entity.id: entity for entity in created}
+        for entity_id, properties in data.get("properties", {}).items():
+            entity = by_id[entity_id]
+            entity._properties = TrackedDict(entity, properties)
+        for entity_id, components in data.get("components", {}).items():
+            entity = by_id[entity_id]
+            entity._components = TrackedDict(entity, {k: Component(k, v) for k, v in components.items()})
+        return cls.from_entities(created, cell_size)
+    
+    @classmethod
+    def from_list(cls, data: list, cell_size: float = 64.0) -> 'EntitySystem':
+        """Rebuild a system from serialized entity dicts"""
+        return cls.from_entities([Entity.from_dict(item) for item in data], cell_size)
+    
+    @classmethod
+    def from_entities(cls, entities: List[Entity], cell_size: float = 64.0) -> 'EntitySystem':
+        system = cls(cell_size)
+        system.add_entities(entities)
+        system.revision = 0
+        system.dirty_ids.clear()
+        return system
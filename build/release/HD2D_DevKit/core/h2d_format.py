@@ -0,0 +1,211 @@
+"""Binary .h2d v2 project container
+
+Layout (little-endian):
+    preamble   magic "H2D2", version u16, flags u16, header offset u64, header length u32
+    chunks     tile id arrays, raw '<u2' or zlib-compressed, back to back
+    header     UTF-8 JSON with project metadata, entities, palette and a
+               per-layer chunk index of [cx, cy, offset, length, codec]
+
+The header is written last so chunks can be streamed straight to disk; the
+preamble is patched with its position once it is known. Chunk offsets are
+relative to the end of the preamble.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from pathlib import Path
+from .tile_layer import TileLayer, TileChunk, TileIdPalette, TILE_DTYPE
+from .entity_system import EntitySystem
+
+MAGIC = b"H2D2"
+FORMAT_VERSION = 2
+PREAMBLE = struct.Struct("<4sHHQI")
+DISK_DTYPE = np.dtype("<u2")
+
+# Held while reading chunks or swapping the mapped file underneath them
+IO_LOCK = threading.RLock()
+
+def is_binary_project(path: str) -> bool:
+    """Check whether a project file uses the binary container"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class ChunkRef:
+    """Location of a chunk inside a mapped project file; calling it loads the tiles"""
+    
+    def __init__(self, reader: 'H2DReader', offset: int, length: int, codec: str, size: int):
+        self.reader = reader
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+        self.size = size
+    
+    def raw(self) -> bytes:
+        with IO_LOCK:
+            return self.reader.read_bytes(self.offset, self.length)
+    
+    def __call__(self) -> np.ndarray:
+        with IO_LOCK:
+            if self.codec == "raw":
+                tiles = self.reader.read_array(self.offset, self.size * self.size)
+                return tiles.reshape(self.size, self.size).astype(TILE_DTYPE)
+            data = self.raw()
+        tiles = np.frombuffer(zlib.decompress(data), dtype=DISK_DTYPE)
+        return tiles.reshape(self.size, self.size).astype(TILE_DTYPE)
+
+class H2DReader:
+    """Memory-mapped read access to a binary project file"""
+    
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.file = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, flags, header_offset, header_length = PREAMBLE.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a binary HD2D project")
+        if version > FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported project format version {version}")
+        
+        self.version = version
+        self.data_start = PREAMBLE.size
+        start = self.data_start + header_offset
+        self.header = json.loads(self.mm[start:start + header_length].decode("utf-8"))
+    
+    def read_bytes(self, offset: int, length: int) -> bytes:
+        start = self.data_start + offset
+        return self.mm[start:start + length]
+    
+    def read_array(self, offset: int, count: int) -> np.ndarray:
+        return np.frombuffer(self.mm, dtype=DISK_DTYPE, count=count, offset=self.data_start + offset)
+    
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def project_header(project: dict, include_entities: bool = True) -> dict:
+    """Build the JSON header for a project, without the per-layer chunk indexes"""
+    header = {k: v for k, v in project.items() if k not in ("layers", "palette", "entities")}
+    header["format_version"] = FORMAT_VERSION
+    if include_entities:
+        header["entities"] = project["entities"].serialize()
+    header["palette"] = project["palette"].to_list()
+    header["layers"] = [
+        {
+            "name": layer.name,
+            "visible": layer.visible,
+            "parallax": layer.parallax,
+            "chunk_size": layer.chunk_size
+        }
+        for layer in project["layers"]
+    ]
+    return header
+
+def read_project(path: str):
+    """Open a binary project; layer chunks are indexed but not read until accessed
+    
+    Returns the project dict and the reader that keeps the file mapped.
+    """
+    reader = H2DReader(path)
+    header = reader.header
+    
+    project = {k: v for k, v in header.items() if k not in ("format_version", "layers", "palette", "entities")}
+    project["palette"] = TileIdPalette.from_list(header.get("palette", []))
+    project["entities"] = EntitySystem.deserialize(header.get("entities", []))
+    project["layers"] = []
+    
+    for layer_data in header.get("layers", []):
+        chunk_size = layer_data["chunk_size"]
+        layer = TileLayer(layer_data["name"], header["width"], header["height"], chunk_size)
+        layer.visible = layer_data.get("visible", True)
+        layer.parallax = layer_data.get("parallax", 100)
+        for cx, cy, offset, length, codec in layer_data["chunks"]:
+            ref = ChunkRef(reader, offset, length, codec, chunk_size)
+            layer.chunks[(cx, cy)] = TileChunk(chunk_size, loader=ref)
+        project["layers"].append(layer)
+    
+    return project, reader
+
+def write_project(project: dict, path: str, compress: bool = True, reader: H2DReader = None) -> H2DReader:
+    """Write a project to the binary container atomically
+    
+    Chunks that were never loaded are copied byte-for-byte from their source
+    file. Afterwards those chunks are re-pointed at the new file, whose reader
+    is returned (the previous reader, if given, is closed).
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pending = []
+    
+    header = project_header(project)
+    
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+        offset = 0
+        for layer, layer_header in zip(project["layers"], header["layers"]):
+            index = []
+            for (cx, cy), chunk in layer.chunks.items():
+                ref = chunk.loader if isinstance(chunk.loader, ChunkRef) else None
+                if ref is not None:
+                    data, codec = ref.raw(), ref.codec
+                    pending.append((ref, offset))
+                else:
+                    if chunk.is_empty():
+                        continue
+                    data, codec = chunk.tiles.astype(DISK_DTYPE).tobytes(), "raw"
+                    if compress:
+                        data, codec = zlib.compress(data, 1), "zlib"
+                f.write(data)
+                index.append([cx, cy, offset, len(data), codec])
+                offset += len(data)
+            layer_header["chunks"] = index
+        
+        finish_file(f, header, offset)
+    
+    with IO_LOCK:
+        # The old mapping must be released before the file can be replaced on Windows
+        if reader is not None:
+            reader.close()
+        os.replace(tmp_path, path)
+        
+        if not pending:
+            return None
+        new_reader = H2DReader(path)
+        for ref, new_offset in pending:
+            ref.reader = new_reader
+            ref.offset = new_offset
+        return new_reader
+
+def finish_file(f, header: dict, data_length: int):
+    """Append the header after data_length bytes of chunks, patch the preamble and sync"""
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    f.write(header_bytes)
+    f.seek(0)
+    f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, data_length, len(header_bytes)))
+    f.flush()
+    os.fsync(f.fileno())
+
+def main():
+    import argparse
+    from .project_manager import ProjectManager
+    
+    parser = argparse.ArgumentParser(description="Convert HD2D projects between JSON and binary formats")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    parser.add_argument("--to", choices=["binary", "json"], default="binary")
+    args = parser.parse_args()
+    
+    ProjectManager(projects_dir=None).convert_project(args.source, args.destination, args.to)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import numpy as np
+from collections import deque
+from typing import Dict, List, Tuple
+from .tile_layer import TileLayer, TILE_DTYPE
+
+INDEX_DTYPE = np.uint16  # local cell index within a chunk (chunk_size ** 2 <= 65536)
+
+class ChunkDelta:
+    """Cells of one chunk changed by a command, with their old and new tile ids"""
+    __slots__ = ("cx", "cy", "cells", "old", "new")
+    
+    def __init__(self, cx: int, cy: int, cells: np.ndarray, old: np.ndarray, new: np.ndarray):
+        self.cx = cx
+        self.cy = cy
+        self.cells = cells
+        self.old = old
+        self.new = new
+    
+    @property
+    def nbytes(self) -> int:
+        return self.cells.nbytes + self.old.nbytes + self.new.nbytes
+
+class TileEditCommand:
+    """A batch of tile changes on one layer, undone or redone one chunk array write at a time"""
+    
+    def __init__(self, layer_index: int, deltas: List[ChunkDelta]):
+        self.layer_index = layer_index
+        self.deltas = deltas
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(delta.nbytes for delta in self.deltas) + 64 * len(self.deltas)
+    
+    @property
+    def cell_count(self) -> int:
+        return sum(len(delta.cells) for delta in self.deltas)
+    
+    def apply(self, tile_layer: TileLayer, undo: bool) -> List[Tuple[int, int]]:
+        """Write old (undo) or new (redo) ids back; returns the chunks touched"""
+        for delta in self.deltas:
+            chunk = tile_layer.get_chunk(delta.cx, delta.cy, create=True)
+            chunk.tiles.reshape(-1)[delta.cells] = delta.old if undo else delta.new
+            chunk.touch()
+        return [(delta.cx, delta.cy) for delta in self.deltas]
+
+class StrokeRecorder:
+    """Copies each chunk the first time a stroke writes to it, then diffs at the end"""
+    
+    def __init__(self, layer_index: int, tile_layer: TileLayer):
+        self.layer_index = layer_index
+        self.tile_layer = tile_layer
+        self.before: Dict[Tuple[int, int], np.ndarray] = {}
+    
+    def capture(self, cx: int, cy: int):
+        if (cx, cy) in self.before:
+            return
+        chunk = self.tile_layer.chunks.get((cx, cy))
+        if chunk is None:
+            size = self.tile_layer.chunk_size
+            self.before[(cx, cy)] = np.zeros(size * size, dtype=TILE_DTYPE)
+        else:
+            self.before[(cx, cy)] = chunk.tiles.reshape(-1).copy()
+    
+    def finish(self) -> TileEditCommand:
+        deltas = []
+        for (cx, cy), before in self.before.items():
+            after = self.tile_layer.chunks[(cx, cy)].tiles.reshape(-1)
+            cells = np.flatnonzero(before != after)
+            if len(cells):
+                deltas.append(ChunkDelta(cx, cy, cells.astype(INDEX_DTYPE), before[cells], after[cells].copy()))
+        return TileEditCommand(self.layer_index, deltas) if deltas else None
+
+class EditHistory:
+    """Undo/redo stacks of tile edits, bounded by the memory their deltas use"""
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.recorder = None
+    
+    def clear(self):
+        self.end_stroke()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.used_bytes = 0
+    
+    def begin_stroke(self, layer_index: int, tile_layer: TileLayer):
+        """Start coalescing every write to a layer into a single command"""
+        self.end_stroke()
+        self.recorder = StrokeRecorder(layer_index, tile_layer)
+        tile_layer.before_write = self.recorder.capture
+    
+    def end_stroke(self) -> TileEditCommand:
+        """Finish the current stroke and push it if it changed anything"""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return None
+        recorder.tile_layer.before_write = None
+        command = recorder.finish()
+        if command is not None:
+            self.push(command)
+        return command
+    
+    def push(self, command: TileEditCommand):
+        self.undo_stack.append(command)
+        self.used_bytes += command.nbytes
+        for dropped in self.redo_stack:
+            self.used_bytes -= dropped.nbytes
+        self.redo_stack.clear()
+        
+        # Evict oldest commands first, but always keep the newest one
+        while self.used_bytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.used_bytes -= self.undo_stack.popleft().nbytes
+    
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+    
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+    
+    def undo(self, tile_layers: List[TileLayer]):
+        """Undo the latest command; returns (layer_index, touched chunks) or None"""
+        self.end_stroke()
+        # Leave the command in place (and its bytes counted) if its layer is gone
+        if not self.undo_stack or self.undo_stack[-1].layer_index >= len(tile_layers):
+            return None
+        command = self.undo_stack.pop()
+        self.redo_stack.append(command)
+        return command.layer_index, command.apply(tile_layers[command.layer_index], undo=True)
+    
+    def redo(self, tile_layers: List[TileLayer]):
+        """Redo the latest undone command; returns (layer_index, touched chunks) or None"""
+        self.end_stroke()
+        # Leave the command in place (and its bytes counted) if its layer is gone
+        if not self.redo_stack or self.redo_stack[-1].layer_index >= len(tile_layers):
+            return None
+        command = self.redo_stack.pop()
+        self.undo_stack.append(command)
+        return command.layer_index, command.apply(tile_layers[command.layer_index], undo=False)
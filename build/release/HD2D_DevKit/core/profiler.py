@@ -0,0 +1,89 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+SAMPLE_WINDOW = 1000  # most recent samples kept per operation for percentiles
+
+class OperationStats:
+    __slots__ = ("count", "total", "max", "samples")
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+    
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+    
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+    
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+class Profiler:
+    """Per-operation wall-clock timers; off unless enabled, costing one flag check per call"""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stats = {}
+        self.lock = threading.Lock()
+    
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = OperationStats()
+            stats.add(seconds)
+    
+    def last(self, name: str) -> float:
+        """Most recent sample of an operation, in seconds"""
+        stats = self.stats.get(name)
+        return stats.samples[-1] if stats and stats.samples else 0.0
+    
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+    
+    def report(self) -> dict:
+        with self.lock:
+            return {name: stats.to_dict() for name, stats in sorted(self.stats.items())}
+    
+    def dump(self, path: str):
+        """Write every timer to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "operations": self.report()}, f, indent=2)
+
+# Shared by the editor and core modules; HD2D_PROFILE=1 turns it on at startup
+PROFILER = Profiler(enabled=os.environ.get("HD2D_PROFILE", "") not in ("", "0"))
+
+def profiled(name: str = None):
+    """Decorator timing every call of a function, by default under its qualified name"""
+    def decorate(func):
+        label = name or func.__qualname__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
@@ -1,12 +1,22 @@
 import json
 import os
 from pathlib import Path
+from .tile_layer import TileLayer, TileIdPalette
+from .entity_system import EntitySystem
+from . import h2d_format
+from . import autosave
+from .profiler import profiled
 
 class ProjectManager:
-    def __init__(self):
+    def __init__(self, projects_dir: str = "assets/projects"):
         self.current_project = None
-        self.projects_dir = Path("assets/projects")
-        self.projects_dir.mkdir(parents=True, exist_ok=True)
+        self.current_path = None
+        self.reader = None  # keeps a binary project's chunks mapped
+        self.save_format = "binary"
+        # None for tools that only open and save explicit paths
+        self.projects_dir = Path(projects_dir) if projects_dir is not None else None
+        if self.projects_dir is not None:
+            self.projects_dir.mkdir(parents=True, exist_ok=True)
     
     def create_project(self, name: str, width: int, height: int, tile_size: int = 32):
         project = {
@@ -14,23 +24,82 @@ class ProjectManager:
             "width": width,
             "height": height,
             "tile_size": tile_size,
-            "layers": [],
-            "entities": []
+            "palette": TileIdPalette(),
+            "layers": [TileLayer("Layer 0", width, height)],
+            "entities": EntitySystem()
         }
         
         project_path = self.projects_dir / f"{name}.h2d"
-        with open(project_path, 'w') as f:
-            json.dump(project, f, indent=2)
+        self.save_project(project, project_path)
         
         self.current_project = project
         return project
     
+    @profiled()
     def load_project(self, path: str):
-        with open(path, 'r') as f:
-            self.current_project = json.load(f)
+        self.close_reader()
+        if h2d_format.is_binary_project(path):
+            self.current_project, self.reader = h2d_format.read_project(path)
+        else:
+            with open(path, 'r') as f:
+                self.current_project = self.from_serializable(json.load(f))
+        self.current_path = str(path)
+        
+        # Recover changes that were autosaved but not yet compacted into the file
+        autosave.replay_journal(self.current_project, self.current_path)
         return self.current_project
     
-    def save_project(self, project: dict, path: str = None):
+    @profiled()
+    def save_project(self, project: dict, path: str = None, fmt: str = None):
         save_path = path or self.projects_dir / f"{project['name']}.h2d"
-        with open(save_path, 'w') as f:
-            json.dump(project, f, indent=2)
+        if (fmt or self.save_format) == "binary":
+            self.reader = h2d_format.write_project(project, save_path, reader=self.reader)
+        else:
+            # Serializing reads every lazy chunk, so the mapping can be dropped before writing
+            data = self.to_serializable(project)
+            self.close_reader()
+            tmp_path = Path(f"{save_path}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, save_path)
+        
+        # The file now holds everything, so any journal for it is obsolete
+        journal = autosave.journal_path(save_path)
+        if os.path.exists(journal):
+            os.remove(journal)
+        self.current_path = str(save_path)
+        for layer in project["layers"]:
+            layer.mark_clean()
+    
+    def convert_project(self, src: str, dst: str, fmt: str = "binary"):
+        """Convert a project file between the JSON and binary formats"""
+        project = self.load_project(src)
+        self.save_project(project, dst, fmt)
+        self.close_reader()
+        self.current_project = None
+    
+    def close_reader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+    
+    @staticmethod
+    def to_serializable(project: dict) -> dict:
+        """Convert live tile layers, palette and entities into plain JSON data"""
+        data = dict(project)
+        data["palette"] = project["palette"].to_list()
+        data["layers"] = [layer.to_dict() for layer in project["layers"]]
+        data["entities"] = project["entities"].serialize()
+        return data
+    
+    @staticmethod
+    def from_serializable(data: dict) -> dict:
+        """Rebuild tile layers, palette and entities from plain JSON data"""
+        project = dict(data)
+        project["palette"] = TileIdPalette.from_list(data.get("palette", []))
+        project["layers"] = [
+            TileLayer.from_dict(layer, data["width"], data["height"])
+            for layer in data.get("layers", [])
+        ]
+        project["entities"] = EntitySystem.deserialize(data.get("entities", []))
+        return project
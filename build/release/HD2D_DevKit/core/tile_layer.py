@@ -0,0 +1,238 @@
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 32
+EMPTY_TILE = 0
+TILE_DTYPE = np.uint16
+
+class TileIdPalette:
+    """Maps compact integer tile ids to tileset tile keys (id 0 is empty)"""
+    
+    def __init__(self, keys: Optional[List[str]] = None):
+        self.keys: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+        for key in keys or []:
+            self.id_for(key)
+    
+    def id_for(self, key: str) -> int:
+        """Return the id for a tile key, registering it if needed"""
+        tile_id = self.ids.get(key)
+        if tile_id is None:
+            tile_id = len(self.keys)
+            if tile_id > np.iinfo(TILE_DTYPE).max:
+                raise ValueError("Tile palette is full")
+            self.keys.append(key)
+            self.ids[key] = tile_id
+        return tile_id
+    
+    def key_for(self, tile_id: int) -> Optional[str]:
+        """Return the tile key for an id, or None for empty/unknown ids"""
+        if 0 < tile_id < len(self.keys):
+            return self.keys[tile_id]
+        return None
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def to_list(self) -> list:
+        return self.keys[1:]
+    
+    @classmethod
+    def from_list(cls, keys: list) -> 'TileIdPalette':
+        return cls(keys)
+
+class TileChunk:
+    """Fixed-size square block of tile ids
+    
+    A chunk may be created with a loader instead of tiles; the array is then
+    read on first access, so unviewed chunks of a mapped project stay on disk.
+    """
+    
+    def __init__(self, size: int, tiles: np.ndarray = None, loader=None):
+        if tiles is None and loader is None:
+            tiles = np.zeros((size, size), dtype=TILE_DTYPE)
+        self.size = size
+        self._tiles = tiles
+        self.loader = loader
+        self.dirty = False
+        self.revision = 0
+    
+    @property
+    def tiles(self) -> np.ndarray:
+        if self._tiles is None:
+            self._tiles = self.loader()
+            self.loader = None
+        return self._tiles
+    
+    @property
+    def loaded(self) -> bool:
+        return self._tiles is not None
+    
+    def touch(self):
+        """Mark the chunk as modified"""
+        self.dirty = True
+        self.revision += 1
+    
+    def is_empty(self) -> bool:
+        return not self.tiles.any()
+
+class TileLayer:
+    """Sparse chunked grid of tile ids for a single map layer"""
+    
+    def __init__(self, name: str, width: int, height: int, chunk_size: int = CHUNK_SIZE):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.visible = True
+        self.parallax = 100
+        self.chunks: Dict[Tuple[int, int], TileChunk] = {}
+        self.before_write = None  # optional callable(cx, cy), e.g. an undo stroke recorder
+    
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+    
+    def get_chunk(self, cx: int, cy: int, create: bool = False) -> Optional[TileChunk]:
+        """Get the chunk at chunk coordinates, optionally allocating it"""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None and create:
+            chunk = TileChunk(self.chunk_size)
+            self.chunks[(cx, cy)] = chunk
+        return chunk
+    
+    def get(self, x: int, y: int) -> int:
+        """Get the tile id at a map position"""
+        if not self.in_bounds(x, y):
+            return EMPTY_TILE
+        cs = self.chunk_size
+        chunk = self.chunks.get((x // cs, y // cs))
+        if chunk is None:
+            return EMPTY_TILE
+        return int(chunk.tiles[y % cs, x % cs])
+    
+    def set(self, x: int, y: int, tile_id: int) -> int:
+        """Set the tile id at a map position and return the previous id"""
+        if not self.in_bounds(x, y):
+            return EMPTY_TILE
+        cs = self.chunk_size
+        chunk = self.get_chunk(x // cs, y // cs, create=tile_id != EMPTY_TILE)
+        if chunk is None:
+            return EMPTY_TILE
+        old_id = int(chunk.tiles[y % cs, x % cs])
+        if old_id != tile_id:
+            if self.before_write is not None:
+                self.before_write(x // cs, y // cs)
+            chunk.tiles[y % cs, x % cs] = tile_id
+            chunk.touch()
+        return old_id
+    
+    def _clip(self, x: int, y: int, w: int, h: int) -> Tuple[int, int, int, int]:
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        return x0, y0, x1, y1
+    
+    def iter_chunk_slices(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[tuple]:
+        """Yield (cx, cy, chunk slice, region slice) covering a clipped map rect"""
+        cs = self.chunk_size
+        for cy in range(y0 // cs, (y1 - 1) // cs + 1):
+            for cx in range(x0 // cs, (x1 - 1) // cs + 1):
+                ax0, ay0 = max(x0, cx * cs), max(y0, cy * cs)
+                ax1, ay1 = min(x1, (cx + 1) * cs), min(y1, (cy + 1) * cs)
+                local = (slice(ay0 - cy * cs, ay1 - cy * cs), slice(ax0 - cx * cs, ax1 - cx * cs))
+                region = (slice(ay0 - y0, ay1 - y0), slice(ax0 - x0, ax1 - x0))
+                yield cx, cy, local, region
+    
+    def get_region(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Read a (h, w) block of tile ids; out-of-bounds cells read as empty"""
+        out = np.zeros((h, w), dtype=TILE_DTYPE)
+        x0, y0, x1, y1 = self._clip(x, y, w, h)
+        if x0 >= x1 or y0 >= y1:
+            return out
+        view = out[y0 - y:y1 - y, x0 - x:x1 - x]
+        for cx, cy, local, region in self.iter_chunk_slices(x0, y0, x1, y1):
+            chunk = self.chunks.get((cx, cy))
+            if chunk is not None:
+                view[region] = chunk.tiles[local]
+        return out
+    
+    def set_region(self, x: int, y: int, tiles: np.ndarray, mask: np.ndarray = None) -> List[Tuple[int, int]]:
+        """Write a block of tile ids at (x, y) and return the chunks that changed
+        
+        If mask is given, only cells where it is True are written.
+        """
+        tiles = np.asarray(tiles, dtype=TILE_DTYPE)
+        h, w = tiles.shape
+        x0, y0, x1, y1 = self._clip(x, y, w, h)
+        if x0 >= x1 or y0 >= y1:
+            return []
+        src = tiles[y0 - y:y1 - y, x0 - x:x1 - x]
+        src_mask = None if mask is None else np.asarray(mask, dtype=bool)[y0 - y:y1 - y, x0 - x:x1 - x]
+        
+        changed = []
+        for cx, cy, local, region in self.iter_chunk_slices(x0, y0, x1, y1):
+            block = src[region]
+            block_mask = None if src_mask is None else src_mask[region]
+            chunk = self.chunks.get((cx, cy))
+            if chunk is None:
+                writes = block if block_mask is None else block[block_mask]
+                if not writes.any():
+                    continue
+                chunk = self.get_chunk(cx, cy, create=True)
+            target = chunk.tiles[local]
+            if block_mask is None:
+                if np.array_equal(target, block):
+                    continue
+                if self.before_write is not None:
+                    self.before_write(cx, cy)
+                target[...] = block
+            else:
+                if np.array_equal(target[block_mask], block[block_mask]):
+                    continue
+                if self.before_write is not None:
+                    self.before_write(cx, cy)
+                np.copyto(target, block, where=block_mask)
+            chunk.touch()
+            changed.append((cx, cy))
+        return changed
+    
+    def fill_region(self, x: int, y: int, w: int, h: int, tile_id: int) -> List[Tuple[int, int]]:
+        """Fill a rect with a single tile id"""
+        return self.set_region(x, y, np.full((max(h, 0), max(w, 0)), tile_id, dtype=TILE_DTYPE))
+    
+    def chunk_bounds(self, cx: int, cy: int) -> Tuple[int, int, int, int]:
+        """Return the (x, y, w, h) map rect covered by a chunk, clipped to the layer"""
+        cs = self.chunk_size
+        x, y = cx * cs, cy * cs
+        return x, y, min(cs, self.width - x), min(cs, self.height - y)
+    
+    def dirty_chunks(self) -> List[Tuple[int, int]]:
+        return [key for key, chunk in self.chunks.items() if chunk.dirty]
+    
+    def mark_clean(self):
+        for chunk in self.chunks.values():
+            chunk.dirty = False
+    
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "visible": self.visible,
+            "parallax": self.parallax,
+            "chunk_size": self.chunk_size,
+            "chunks": {
+                f"{cx},{cy}": chunk.tiles.ravel().tolist()
+                for (cx, cy), chunk in self.chunks.items()
+                if not chunk.is_empty()
+            }
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict, width: int, height: int) -> 'TileLayer':
+        chunk_size = data.get("chunk_size", CHUNK_SIZE)
+        layer = cls(data.get("name", "Layer"), width, height, chunk_size)
+        layer.visible = data.get("visible", True)
+        layer.parallax = data.get("parallax", 100)
+        for key, values in data.get("chunks", {}).items():
+            cx, cy = (int(v) for v in key.split(","))
+            tiles = np.array(values, dtype=TILE_DTYPE).reshape(chunk_size, chunk_size)
+            layer.chunks[(cx, cy)] = TileChunk(chunk_size, tiles)
+        return layer
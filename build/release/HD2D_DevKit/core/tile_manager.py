@@ -1,33 +1,220 @@
-from PIL import Image, ImageQt
+from PIL import Image
+from collections import OrderedDict
 from pathlib import Path
+import hashlib
 import json
+import os
+import zlib
+import numpy as np
+from .profiler import profiled
+
+class ByteLRU:
+    """Least-recently-used cache bounded by the total size of its values"""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.entries = OrderedDict()  # key -> (value, nbytes)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key, value, nbytes: int):
+        self.pop(key)
+        self.entries[key] = (value, nbytes)
+        self.used_bytes += nbytes
+        while self.used_bytes > self.max_bytes and len(self.entries) > 1:
+            self.pop(next(iter(self.entries)))
+    
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry[1]
+    
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
 
 class TileManager:
-    def __init__(self):
-        self.tiles = {}
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, cache_bytes: int = 256 * 1024 * 1024,
+                 assets_dir: str = "assets/tiles", cache_dir: str = "assets/cache/tiles"):
+        # Decoded atlases and cut tiles share one memory budget
+        self.tiles = ByteLRU(max_bytes)
+        self.cache_bytes = cache_bytes
         self.tilesets = {}
-        self.assets_dir = Path("assets/tiles")
-        self.assets_dir.mkdir(parents=True, exist_ok=True)
+        # Either folder may be None: no tileset folder is created, or no slice cache is kept on disk
+        self.assets_dir = Path(assets_dir) if assets_dir is not None else None
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        for folder in (self.assets_dir, self.cache_dir):
+            if folder is not None:
+                folder.mkdir(parents=True, exist_ok=True)
     
+    @profiled()
     def load_tileset(self, name: str, path: str, tile_size: int):
-        """Load a tileset image and split into individual tiles"""
-        img = Image.open(path).convert("RGBA")
-        tiles = {}
+        """Register a tileset and return its tile ids; tiles are cut on demand"""
+        stat = Path(path).stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        info = self.tilesets.get(name)
+        if info and info["path"] == path and info["tile_size"] == tile_size and info["stamp"] == stamp:
+            return info["tiles"]
         
-        for y in range(0, img.height, tile_size):
-            for x in range(0, img.width, tile_size):
-                tile_id = f"{name}_{x}_{y}"
-                tile_img = img.crop((x, y, x + tile_size, y + tile_size))
-                tiles[tile_id] = ImageQt.ImageQt(tile_img)
-        
-        self.tilesets[name] = {
+        file_hash = hashlib.sha1(Path(path).read_bytes()).hexdigest()[:16]
+        info = {
             "path": path,
             "tile_size": tile_size,
-            "tiles": tiles
+            "stamp": stamp,
+            "cache_key": f"{file_hash}_{tile_size}"
         }
-        return tiles
+        self.drop_tileset(name)
+        self.tilesets[name] = info
+        
+        # Only the image header is needed to list the tiles
+        with Image.open(path) as image:
+            width, height = image.size
+        info["tiles"] = [
+            f"{name}_{x}_{y}"
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)
+        ]
+        return info["tiles"]
+    
+    def drop_tileset(self, name: str):
+        """Forget a tileset and evict its atlas and tiles from memory"""
+        if self.tilesets.pop(name, None) is None:
+            return
+        for key in [k for k in self.tiles.entries if k[1] == name]:
+            self.tiles.pop(key)
+    
+    @profiled()
+    def load_pixels(self, name: str) -> np.ndarray:
+        """Get the RGBA pixels of a tileset from the slice cache or the image file"""
+        info = self.tilesets[name]
+        pixels = self.read_slice_cache(info["cache_key"])
+        if pixels is None:
+            pixels = self.decode_atlas(info["path"], info["tile_size"])
+            self.write_slice_cache(info, pixels)
+        return pixels
+    
+    def load_atlas(self, name: str):
+        """Get the decoded atlas for a tileset as a QImage, from memory, the slice cache or the image file"""
+        atlas = self.tiles.get(("atlas", name))
+        if atlas is not None:
+            return atlas[0]
+        
+        # Qt is only needed for drawing, so headless tools can use this module without it
+        from PyQt6.QtGui import QImage
+        pixels = self.load_pixels(name)
+        height, width = pixels.shape[:2]
+        image = QImage(pixels.data, width, height, width * 4, QImage.Format.Format_RGBA8888)
+        # Keep the array alive alongside the QImage that wraps its buffer
+        self.tiles.put(("atlas", name), (image, pixels), pixels.nbytes)
+        return image
+    
+    @staticmethod
+    def decode_atlas(path: str, tile_size: int) -> np.ndarray:
+        """Decode an image to RGBA, padded with transparency to whole tiles"""
+        pixels = np.asarray(Image.open(path).convert("RGBA"))
+        height, width = pixels.shape[:2]
+        pad_y, pad_x = -height % tile_size, -width % tile_size
+        if pad_y or pad_x:
+            pixels = np.pad(pixels, ((0, pad_y), (0, pad_x), (0, 0)))
+        return np.ascontiguousarray(pixels)
+    
+    def read_slice_cache(self, cache_key: str) -> np.ndarray:
+        """Decoded pixels stored by an earlier run, or None"""
+        if self.cache_dir is None:
+            return None
+        meta_path = self.cache_dir / f"{cache_key}.json"
+        data_path = self.cache_dir / f"{cache_key}.rgba.z"
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            pixels = np.frombuffer(zlib.decompress(data_path.read_bytes()), dtype=np.uint8)
+            # Bump the modification time so pruning drops the least recently used entries
+            os.utime(data_path)
+        except (OSError, ValueError, zlib.error):
+            return None
+        if pixels.size != meta["width"] * meta["height"] * 4:
+            return None
+        return pixels.reshape(meta["height"], meta["width"], 4)
+    
+    def write_slice_cache(self, info: dict, pixels: np.ndarray):
+        if self.cache_dir is None:
+            return
+        cache_key = info["cache_key"]
+        try:
+            (self.cache_dir / f"{cache_key}.rgba.z").write_bytes(zlib.compress(pixels.tobytes(), 1))
+            with open(self.cache_dir / f"{cache_key}.json", 'w') as f:
+                json.dump({"width": pixels.shape[1], "height": pixels.shape[0],
+                           "path": str(Path(info["path"]).resolve()), "tile_size": info["tile_size"]}, f)
+            self.prune_slice_cache(cache_key)
+        except OSError:
+            # The cache is an optimisation only; a read-only assets folder is fine
+            pass
+    
+    def prune_slice_cache(self, keep: str):
+        """Drop entries for older versions of the same tileset, then the least recently used over budget"""
+        entries = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            data_path = meta_path.with_suffix(".rgba.z")
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                stat = data_path.stat()
+            except (OSError, ValueError):
+                meta_path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, meta_path.stem, meta, meta_path, data_path))
+        
+        current = next((entry[3] for entry in entries if entry[2] == keep), None)
+        used = 0
+        for mtime, size, cache_key, meta, meta_path, data_path in sorted(entries, key=lambda e: e[0], reverse=True):
+            outdated = (current is not None and cache_key != keep and meta.get("path") == current["path"]
+                        and meta.get("tile_size") == current["tile_size"])
+            if cache_key != keep and (outdated or used + size > self.cache_bytes):
+                data_path.unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
+                continue
+            used += size
+    
+    def tile_rect(self, tileset: str, x: int, y: int):
+        """Source rect of a tile within its atlas"""
+        from PyQt6.QtCore import QRect
+        tile_size = self.tilesets[tileset]["tile_size"]
+        return QRect(x, y, tile_size, tile_size)
     
     def get_tile(self, tileset: str, x: int, y: int):
         """Get a specific tile from a tileset"""
-        tile_id = f"{tileset}_{x}_{y}"
-        return self.tilesets.get(tileset, {}).get("tiles", {}).get(tile_id)
+        key = ("tile", tileset, x, y)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            return tile
+        if tileset not in self.tilesets:
+            return None
+        
+        tile = self.load_atlas(tileset).copy(self.tile_rect(tileset, x, y))
+        self.tiles.put(key, tile, tile.sizeInBytes())
+        return tile
+    
+    def get_tile_by_id(self, tile_id: str):
+        """Get a tile from an id of the form '<tileset>_<x>_<y>'"""
+        parsed = self.split_tile_id(tile_id)
+        if parsed is None:
+            return None
+        return self.get_tile(*parsed)
+    
+    @staticmethod
+    def split_tile_id(tile_id: str):
+        """Split a tile id into (tileset, x, y), or None if it is malformed"""
+        parts = tile_id.rsplit("_", 2) if tile_id else []
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            return None
+        return parts[0], int(parts[1]), int(parts[2])
@@ -0,0 +1,12 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Run every test in its own folder; managers create assets/ under the cwd"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
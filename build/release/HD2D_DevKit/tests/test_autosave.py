@@ -0,0 +1,238 @@
+import json
+import os
+import zlib
+import numpy as np
+from core import autosave
+from core.autosave import AutosaveService, compact, journal_path, read_journal
+from core.entity_system import EntitySystem
+from core.h2d_format import ChunkRef
+from core.project_manager import ProjectManager
+from core.tile_layer import TileLayer, TileIdPalette, TILE_DTYPE
+
+SIZE = 100
+
+def make_project(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    palette = TileIdPalette()
+    ids = [palette.id_for(f"grass.png:{i * 32}:0") for i in range(8)]
+    layers = []
+    for index in range(2):
+        layer = TileLayer(f"Layer {index}", SIZE, SIZE)
+        layer.set_region(0, 0, rng.choice(ids, (SIZE, SIZE)).astype(TILE_DTYPE))
+        layers.append(layer)
+    entities = EntitySystem()
+    entities.create_entity("chest", 40.0, 72.0)
+    return {"name": "test", "width": SIZE, "height": SIZE, "tile_size": 32,
+            "palette": palette, "layers": layers, "entities": entities}
+
+def tiles_of(project: dict) -> list:
+    return [layer.get_region(0, 0, SIZE, SIZE) for layer in project["layers"]]
+
+def saved_project(work_dir, seed: int = 0):
+    """A binary project on disk, loaded back lazily, with its expected tiles"""
+    path = str(work_dir / "test.h2d")
+    project = make_project(seed)
+    expected = tiles_of(project)
+    writer = ProjectManager()
+    writer.save_project(project, path)
+    writer.close_reader()
+    
+    project_manager = ProjectManager()
+    project = project_manager.load_project(path)
+    return project_manager, project, path, expected
+
+def load_tiles(path: str) -> list:
+    project_manager = ProjectManager()
+    tiles = tiles_of(project_manager.load_project(path))
+    project_manager.close_reader()
+    return tiles
+
+def test_binary_round_trip_copies_lazy_chunks(work_dir):
+    project_manager, project, path, expected = saved_project(work_dir)
+    layer = project["layers"][1]
+    layer.set(5, 5, 0)
+    expected[1][5, 5] = 0
+    assert sum(chunk.loaded for chunk in layer.chunks.values()) == 1
+    
+    # Unloaded chunks are copied from the old file rather than decoded
+    project_manager.save_project(project, path)
+    assert not any(chunk.loaded for chunk in project["layers"][0].chunks.values())
+    project_manager.close_reader()
+    
+    for saved, tiles in zip(load_tiles(path), expected):
+        assert np.array_equal(saved, tiles)
+
+def test_legacy_json_load(work_dir):
+    path = work_dir / "old.h2d"
+    chunk = [0] * (32 * 32)
+    chunk[33] = 1
+    with open(path, 'w') as f:
+        json.dump({
+            "name": "old", "width": 40, "height": 40, "tile_size": 32,
+            "palette": ["grass.png:0:0"],
+            "layers": [{"name": "Ground", "chunks": {"0,0": chunk}}],
+            "entities": [{"id": "e1", "name": "door", "x": 10, "y": 20, "type": "trigger",
+                          "properties": {"collidable": True}}]
+        }, f)
+    
+    project = ProjectManager().load_project(str(path))
+    layer = project["layers"][0]
+    assert layer.get(1, 1) == 1 and project["palette"].key_for(1) == "grass.png:0:0"
+    assert layer.visible and layer.parallax == 100
+    entity = project["entities"].get_entity("e1")
+    assert (entity.name, entity.type, entity.x, entity.y) == ("door", "trigger", 10, 20)
+    assert entity.properties["collidable"]
+
+def test_replay_ignores_torn_tail(work_dir):
+    project_manager, project, path, expected = saved_project(work_dir)
+    service = AutosaveService(project_manager)
+    service.reset(project)
+    project["layers"][0].set(3, 4, 0)
+    expected[0][4, 3] = 0
+    assert service.save()
+    service.flush()
+    
+    # A crash mid-batch leaves an uncommitted chunk record and a cut-off record
+    jpath = journal_path(path)
+    committed = os.path.getsize(jpath)
+    payload = autosave.CHUNK_KEY.pack(0, 0, 0, True)
+    with open(jpath, 'ab') as f:
+        f.write(autosave.RECORD.pack(autosave.REC_CHUNK, len(payload), zlib.crc32(payload)) + payload)
+        f.write(autosave.RECORD.pack(autosave.REC_COMMIT, 8, 0)[:5])
+    project_manager.close_reader()
+    
+    assert read_journal(jpath)[3] == committed
+    for saved, tiles in zip(load_tiles(path), expected):
+        assert np.array_equal(saved, tiles)
+
+def test_compact_repoints_live_chunk_refs(work_dir):
+    project_manager, project, path, expected = saved_project(work_dir)
+    service = AutosaveService(project_manager)
+    service.reset(project)
+    project["layers"][1].set(70, 70, 0)
+    expected[1][70, 70] = 0
+    service.save()
+    service.flush()
+    
+    written = compact(project_manager, project, path)
+    assert written == os.path.getsize(path)
+    assert not os.path.exists(journal_path(path))
+    refs = [chunk.loader for layer in project["layers"] for chunk in layer.chunks.values() if not chunk.loaded]
+    assert refs and all(isinstance(ref, ChunkRef) and ref.reader is project_manager.reader for ref in refs)
+    # Chunks loaded after compaction read from the new file
+    for live, tiles in zip(tiles_of(project), expected):
+        assert np.array_equal(live, tiles)
+    project_manager.close_reader()
+    for saved, tiles in zip(load_tiles(path), expected):
+        assert np.array_equal(saved, tiles)
+
+def test_worker_error_keeps_changes_for_next_save(work_dir):
+    project_manager, project, path, expected = saved_project(work_dir)
+    results = []
+    service = AutosaveService(project_manager, on_saved=results.append)
+    service.reset(project)
+    
+    write = service.write
+    def fail(job):
+        raise ValueError("disk on fire")
+    service.write = fail
+    project["layers"][0].set(1, 1, 0)
+    expected[0][1, 1] = 0
+    service.save()
+    service.flush()
+    assert results[-1]["error"] == "ValueError: disk on fire"
+    assert project["layers"][0].chunks[(0, 0)].dirty
+    
+    service.write = write
+    assert service.save()
+    service.flush()
+    assert results[-1]["error"] is None
+    project_manager.close_reader()
+    for saved, tiles in zip(load_tiles(path), expected):
+        assert np.array_equal(saved, tiles)
+
+def test_entity_property_edits_are_journaled(work_dir):
+    project_manager, project, path, _ = saved_project(work_dir)
+    service = AutosaveService(project_manager)
+    service.reset(project)
+    entity = project["entities"].get_all_entities()[0]
+    entity.properties["collidable"] = True
+    entity.name = "open chest"
+    assert service.save()
+    service.flush()
+    project_manager.close_reader()
+    
+    reloaded = ProjectManager().load_project(path)["entities"].get_entity(entity.id)
+    assert reloaded.name == "open chest" and reloaded.properties["collidable"]
+
+def test_new_project_over_journaled_one_keeps_later_saves(work_dir):
+    # The sequence MainWindow.new_project runs, twice for the same name
+    project_manager = ProjectManager()
+    service = AutosaveService(project_manager)
+    project = project_manager.create_project("MyGame", 64, 64)
+    service.reset(project)
+    project["layers"][0].set(1, 1, project["palette"].id_for("grass.png_0_0"))
+    assert service.save()
+    service.flush()
+    
+    service.save()
+    service.flush()
+    project = project_manager.create_project("MyGame", 64, 64)
+    service.reset(project)
+    tile_id = project["palette"].id_for("grass.png_32_0")
+    project["layers"][0].set(2, 3, tile_id)
+    assert service.save()
+    service.flush()
+    project_manager.close_reader()
+    
+    path = project_manager.current_path
+    assert read_journal(journal_path(path))[1]
+    assert ProjectManager().load_project(path)["layers"][0].get(2, 3) == tile_id
+
+def test_entity_edits_journal_only_changed_entities(work_dir):
+    path = str(work_dir / "many.h2d")
+    project = make_project()
+    entities = project["entities"]
+    for i in range(1000):
+        entities.create_entity(f"coin {i}", i * 8.0, 16.0)
+    writer = ProjectManager()
+    writer.save_project(project, path)
+    writer.close_reader()
+    
+    project_manager = ProjectManager()
+    project = project_manager.load_project(path)
+    service = AutosaveService(project_manager)
+    service.reset(project)
+    entities = project["entities"]
+    coins = [entity for entity in entities.entities.values() if entity.name.startswith("coin")]
+    entities.move_entity(coins[0].id, 500.0, 600.0)
+    entities.remove_entity(coins[1].id)
+    project["layers"][0].set(0, 0, 0)
+    assert service.save()
+    service.flush()
+    
+    meta, _, changes, _ = read_journal(journal_path(path))
+    assert meta is None
+    assert changes == {coins[0].id: coins[0].to_dict(), coins[1].id: None}
+    
+    # A layer-only save writes no entity records
+    project["layers"][0].set(1, 0, 0)
+    assert service.save()
+    service.flush()
+    assert len(read_journal(journal_path(path))[2]) == 2
+    project_manager.close_reader()
+    
+    for compacted in (False, True):
+        project_manager = ProjectManager()
+        reloaded = project_manager.load_project(path)
+        if compacted:
+            compact(project_manager, reloaded, path)
+            assert not os.path.exists(journal_path(path))
+            reloaded = project_manager.load_project(path)
+        project_manager.close_reader()
+        reloaded = reloaded["entities"]
+        assert len(reloaded.entities) == 1000
+        assert reloaded.get_entity(coins[1].id) is None
+        moved = reloaded.get_entity(coins[0].id)
+        assert (moved.x, moved.y) == (500.0, 600.0)
+
@@ -0,0 +1,91 @@
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+from core.bake import TileTable, bake_project
+from core.entity_system import EntitySystem
+from core.project_manager import ProjectManager
+from core.tile_layer import TileIdPalette, TileLayer
+from core.tile_manager import TileManager
+
+def test_tile_table_decodes_each_tileset_once(work_dir):
+    rng = np.random.default_rng(0)
+    atlas = rng.integers(0, 256, (64, 96, 4), dtype=np.uint8)
+    Image.fromarray(atlas, "RGBA").save(work_dir / "grass.png")
+    tile_manager = TileManager()
+    tile_ids = tile_manager.load_tileset("grass.png", str(work_dir / "grass.png"), 32)
+    palette = TileIdPalette(tile_ids + ["lava.png_0_0"])
+    
+    loads = []
+    load_pixels = tile_manager.load_pixels
+    tile_manager.load_pixels = lambda name: loads.append(name) or load_pixels(name)
+    table = TileTable(palette, tile_manager, Path(work_dir), 32)
+    for tile_id in range(1, len(palette) + 1):
+        table.tile(tile_id)
+    
+    assert loads == ["grass.png"]
+    assert np.array_equal(table.tile(palette.id_for("grass.png_64_32")), atlas[32:64, 64:96])
+    assert table.missing == {"lava.png_0_0"}
+
+def test_bake_project_end_to_end(work_dir):
+    rng = np.random.default_rng(1)
+    atlas = rng.integers(0, 256, (32, 64, 4), dtype=np.uint8)
+    atlas[..., 3] = 255
+    tiles_dir, out_dir = work_dir / "tiles", work_dir / "out"
+    tiles_dir.mkdir()
+    Image.fromarray(atlas, "RGBA").save(tiles_dir / "grass.png")
+    
+    palette = TileIdPalette(["grass.png_0_0", "grass.png_32_0"])
+    layer = TileLayer("Ground", 40, 40)
+    layer.set(1, 0, 2)
+    layer.set(35, 36, 1)
+    entities = EntitySystem()
+    wall = entities.create_entity("wall", 3 * 32 + 5.0, 2 * 32 + 5.0)
+    wall.properties["collidable"] = True
+    entities.create_entity("coin", 36 * 32.0, 33 * 32.0)
+    project = {"name": "level", "width": 40, "height": 40, "tile_size": 32,
+               "palette": palette, "layers": [layer], "entities": entities}
+    path = str(work_dir / "level.h2d")
+    project_manager = ProjectManager(projects_dir=None)
+    project_manager.save_project(project, path)
+    project_manager.close_reader()
+    
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        bake = lambda: bake_project(path, str(out_dir), pool, str(tiles_dir))
+        result = bake()
+        assert (result["rendered"], result["skipped"], result["removed"]) == (2, 0, 0)
+        assert not result["missing_tiles"]
+        target = out_dir / "level"
+        assert sorted(p.name for p in (target / "chunks").iterdir()) == ["0_0.png", "1_1.png"]
+        chunk = np.asarray(Image.open(target / "chunks" / "0_0.png"))
+        assert chunk.shape == (32 * 32, 32 * 32, 4)
+        assert np.array_equal(chunk[:32, 32:64], atlas[:, 32:64]) and not chunk[32:].any()
+        assert np.array_equal(np.asarray(Image.open(target / "chunks" / "1_1.png"))[4 * 32:5 * 32, 3 * 32:4 * 32],
+                              atlas[:, :32])
+        
+        collision = np.asarray(Image.open(target / "collision.png"))
+        assert collision.shape == (40, 40) and np.argwhere(collision).tolist() == [[2, 3]]
+        manifest = json.loads((target / "entities.json").read_text())
+        chunks = {entity["name"]: entity["chunk"] for entity in manifest["entities"]}
+        assert chunks == {"wall": [0, 0], "coin": [1, 1]}
+        assert [entity["id"] for entity in manifest["entities"]] == sorted(entities.entities)
+        
+        # Unchanged chunks are skipped and their files left alone
+        stamp = (target / "chunks" / "0_0.png").stat().st_mtime_ns
+        result = bake()
+        assert (result["rendered"], result["skipped"], result["removed"]) == (0, 2, 0)
+        assert (target / "chunks" / "0_0.png").stat().st_mtime_ns == stamp
+        
+        # A chunk that became empty is removed from the output
+        project = project_manager.load_project(path)
+        project["layers"][0].set(35, 36, 0)
+        project_manager.save_project(project, path)
+        project_manager.close_reader()
+        result = bake()
+        assert (result["rendered"], result["skipped"], result["removed"]) == (0, 1, 1)
+        assert not (target / "chunks" / "1_1.png").exists()
+    
+    # Nothing is written outside the output folder
+    assert not (work_dir / "assets").exists()
+    assert list((out_dir / ".cache" / "tiles").glob("*.json"))
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtGui import QImage
+from PyQt6.QtWidgets import QApplication
+from core.tile_layer import TileLayer, TileIdPalette
+from ui.chunk_cache import ChunkPixmapCache, MAX_PIXMAP_PX, PLACEHOLDER_COLOR, image_pixels
+
+APP = QApplication.instance() or QApplication([])
+
+def make_cache(tiles: dict) -> ChunkPixmapCache:
+    images = {}
+    for key, pixels in tiles.items():
+        image = QImage(pixels.data, pixels.shape[1], pixels.shape[0], pixels.shape[1] * 4, QImage.Format.Format_RGBA8888)
+        images[key] = image.copy()
+    cache = ChunkPixmapCache()
+    cache.palette = TileIdPalette(list(tiles) + ["missing"])
+    cache.tile_source = images.get
+    return cache
+
+def test_chunks_render_tiles_at_every_level_of_detail():
+    rng = np.random.default_rng(0)
+    red, noise = np.zeros((32, 32, 4), dtype=np.uint8), rng.integers(0, 256, (32, 32, 4), dtype=np.uint8)
+    red[..., 0], red[..., 3] = 200, 255
+    red[:16] = 0  # half transparent: the average keeps the colour
+    noise[..., 3] = 255
+    cache = make_cache({"red": red, "noise": noise})
+    layer = TileLayer("Ground", 64, 64)
+    layer.set(0, 0, 1)
+    layer.set(1, 0, 2)
+    layer.set(2, 0, 3)
+    
+    full = image_pixels(cache.get(0, layer, 0, 0, 32).toImage())
+    assert np.array_equal(full[:32, :32], red) and np.array_equal(full[:32, 32:64], noise)
+    assert (full[:32, 64:96] == PLACEHOLDER_COLOR).all() and not full[32:].any()
+    
+    small = image_pixels(cache.get(0, layer, 0, 0, 1).toImage())
+    assert small.shape == (32, 32, 4)
+    assert np.allclose(small[0, 0], (200, 0, 0, 128), atol=1)
+    assert np.allclose(small[0, 1, :3], noise[..., :3].reshape(-1, 3).mean(axis=0), atol=1)
+    assert not small[1:].any()
+
+def test_deferred_misses_fall_back_to_another_size():
+    cache = make_cache({"red": np.full((32, 32, 4), 255, dtype=np.uint8)})
+    layer = TileLayer("Ground", 64, 64)
+    layer.set(0, 0, 1)
+    coarse = cache.get(0, layer, 0, 0, 4)
+    assert cache.get(0, layer, 0, 0, 8, render=False) is coarse
+    assert cache.get(0, layer, 1, 1, 8, render=False) is None
+    assert cache.deferred == 1 and cache.misses == 1
+
+def test_large_tiles_are_capped_and_tables_counted():
+    cache = make_cache({"big": np.full((256, 256, 4), 255, dtype=np.uint8)})
+    layer = TileLayer("Ground", 64, 64)
+    layer.set(0, 0, 1)
+    pixmap = cache.get(0, layer, 0, 0, 256)
+    assert max(pixmap.width(), pixmap.height()) == MAX_PIXMAP_PX
+    assert cache.get(0, layer, 0, 0, 256) is pixmap and cache.hits == 1
+    
+    table_px = MAX_PIXMAP_PX // layer.chunk_size
+    assert list(cache.tile_tables) == [table_px]
+    assert cache.table_bytes == cache.tile_tables[table_px][0].nbytes
+    assert cache.used_bytes == cache.table_bytes + cache.pixmap_bytes(pixmap)
+    
+    # Over budget, tables of sizes not being rendered are dropped too
+    cache.max_bytes = cache.table_bytes
+    cache.get(0, layer, 0, 0, 8)
+    assert list(cache.tile_tables) == [8]
+    assert cache.used_bytes == cache.table_bytes + sum(cache.pixmap_bytes(e[1]) for e in cache.entries.values())
+    cache.clear()
+    assert cache.used_bytes == cache.table_bytes == 0
+
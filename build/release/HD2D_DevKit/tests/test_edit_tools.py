@@ -0,0 +1,93 @@
+from collections import deque
+import numpy as np
+from core.edit_tools import flood_fill_mask, line_cells, polyline_cells, stamp_pattern
+from core.tile_layer import TILE_DTYPE
+
+def bfs_fill(tiles: np.ndarray, x: int, y: int) -> np.ndarray:
+    h, w = tiles.shape
+    mask = np.zeros(tiles.shape, dtype=bool)
+    mask[y, x] = True
+    queue = deque([(x, y)])
+    while queue:
+        cx, cy = queue.popleft()
+        for nx, ny in ((cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)):
+            if 0 <= nx < w and 0 <= ny < h and not mask[ny, nx] and tiles[ny, nx] == tiles[y, x]:
+                mask[ny, nx] = True
+                queue.append((nx, ny))
+    return mask
+
+def serpentine(w: int, h: int) -> np.ndarray:
+    """Walls on every other row, open at alternating ends: one long corridor"""
+    tiles = np.zeros((h, w), dtype=TILE_DTYPE)
+    for row in range(1, h, 2):
+        tiles[row] = 1
+        tiles[row, -1 if row % 4 == 1 else 0] = 0
+    return tiles
+
+def spiral(size: int) -> np.ndarray:
+    """A wall spiralling inwards, leaving a single winding passage"""
+    tiles = np.zeros((size, size), dtype=TILE_DTYPE)
+    lo, hi = 0, size - 1
+    tiles[0, :] = 1
+    while hi - lo > 2:
+        tiles[lo:hi + 1, hi] = 1
+        tiles[hi, lo:hi + 1] = 1
+        tiles[lo + 2:hi + 1, lo] = 1
+        tiles[lo + 2, lo:hi - 1] = 1
+        lo, hi = lo + 2, hi - 2
+    return tiles
+
+def test_flood_fill_matches_bfs_on_random_grids():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        h, w = rng.integers(1, 40, 2)
+        tiles = rng.integers(0, rng.integers(1, 4), (h, w)).astype(TILE_DTYPE)
+        for x, y in zip(rng.integers(0, w, 5), rng.integers(0, h, 5)):
+            assert np.array_equal(flood_fill_mask(tiles, x, y), bfs_fill(tiles, x, y))
+
+def test_flood_fill_matches_bfs_on_mazes():
+    for tiles in (serpentine(37, 41), serpentine(64, 64), spiral(41), spiral(64)):
+        h, w = tiles.shape
+        for x, y in ((0, 0), (w - 1, h - 1), (w // 2, h // 2), (w - 1, 0)):
+            assert np.array_equal(flood_fill_mask(tiles, x, y), bfs_fill(tiles, x, y))
+    # The corridor of the serpentine is one region reaching both far corners
+    region = flood_fill_mask(serpentine(64, 64), 0, 0)
+    assert region[0, 0] and region[62, 63] and region.sum() == (serpentine(64, 64) == 0).sum()
+
+def test_line_cells_are_connected_and_end_at_both_points():
+    rng = np.random.default_rng(1)
+    for x0, y0, x1, y1 in rng.integers(-20, 20, (200, 4)):
+        xs, ys = line_cells(x0, y0, x1, y1)
+        assert (xs[0], ys[0]) == (x0, y0) and (xs[-1], ys[-1]) == (x1, y1)
+        assert len(xs) == max(abs(x1 - x0), abs(y1 - y0)) + 1
+        steps = np.abs(np.diff(xs)), np.abs(np.diff(ys))
+        assert (np.maximum(*steps) == 1).all()
+        # Every cell is within half a cell of the ideal line
+        t = np.arange(len(xs)) / max(len(xs) - 1, 1)
+        assert (np.abs(xs - (x0 + t * (x1 - x0))) <= 0.5).all()
+        assert (np.abs(ys - (y0 + t * (y1 - y0))) <= 0.5).all()
+    assert [list(c) for c in line_cells(0, 0, 5, 2)] == [[0, 1, 2, 3, 4, 5], [0, 0, 1, 1, 2, 2]]
+    assert [list(c) for c in line_cells(3, 3, 3, 3)] == [[3], [3]]
+    assert [list(c) for c in polyline_cells([(0, 0), (2, 0), (2, 1)])] == [[0, 1, 2, 2, 2], [0, 0, 0, 0, 1]]
+
+def test_stamp_pattern_matches_stamping_one_by_one():
+    rng = np.random.default_rng(2)
+    ids = rng.integers(1, 9, (3, 4)).astype(TILE_DTYPE)
+    mask = rng.random((3, 4)) < 0.6
+    xs, ys = rng.integers(-5, 25, 12), rng.integers(-5, 25, 12)
+    x, y, block, block_mask = stamp_pattern(xs, ys, ids, mask, 20, 20)
+    
+    expected = np.zeros((20, 20), dtype=TILE_DTYPE)
+    expected_mask = np.zeros((20, 20), dtype=bool)
+    for sx, sy in zip(xs, ys):
+        for dy, dx in zip(*np.nonzero(mask)):
+            if 0 <= sx + dx < 20 and 0 <= sy + dy < 20:
+                expected[sy + dy, sx + dx] = ids[dy, dx]
+                expected_mask[sy + dy, sx + dx] = True
+    h, w = block.shape
+    assert x >= 0 and y >= 0 and x + w <= 20 and y + h <= 20
+    assert not expected_mask[:y].any() and not expected_mask[:, :x].any()
+    assert np.array_equal(block_mask, expected_mask[y:y + h, x:x + w])
+    assert np.array_equal(np.where(block_mask, block, 0), expected[y:y + h, x:x + w])
+    assert stamp_pattern(np.array([30]), np.array([0]), ids, mask, 20, 20) is None
+    assert stamp_pattern(np.array([-4]), np.array([-3]), ids, mask, 20, 20) is None
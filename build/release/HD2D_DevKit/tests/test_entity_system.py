@@ -0,0 +1,68 @@
+import math
+import numpy as np
+from core.entity_system import Component, EntitySystem
+
+def brute_nearest(system: EntitySystem, x: float, y: float):
+    return min(system.entities.values(), key=lambda e: (e.x - x) ** 2 + (e.y - y) ** 2)
+
+def distance(entity, x: float, y: float) -> float:
+    return math.hypot(entity.x - x, entity.y - y)
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    system = EntitySystem()
+    system.create_entities([f"e{i}" for i in range(500)], rng.random(500) * 5000, rng.random(500) * 5000)
+    for x, y in rng.random((200, 2)) * 7000 - 1000:
+        found = system.nearest(x, y)
+        assert distance(found, x, y) == distance(brute_nearest(system, x, y), x, y)
+
+def test_nearest_far_from_sparse_entities():
+    system = EntitySystem()
+    system.create_entity("a", 0.0, 0.0)
+    far = system.create_entity("b", 3_000_000.0, -2_000_000.0)
+    assert system.nearest(100000.0, 100000.0).name == "a"
+    assert system.nearest(2_900_000.0, -1_900_000.0) is far
+    assert system.nearest(100000.0, 100000.0, max_distance=1000.0) is None
+    assert EntitySystem().nearest(0.0, 0.0) is None
+
+def test_direct_edits_bump_revision():
+    system = EntitySystem()
+    entity = system.create_entity("chest", 10.0, 20.0)
+    edits = [
+        lambda: entity.properties.__setitem__("collidable", True),
+        lambda: entity.properties.update(layer=2),
+        lambda: entity.properties.pop("visible"),
+        lambda: setattr(entity, "name", "open chest"),
+        lambda: setattr(entity, "type", "trigger"),
+        lambda: entity.add_component(Component("loot", {"gold": 5}))
+    ]
+    for edit in edits:
+        revision = system.revision
+        edit()
+        assert system.revision > revision
+    
+    restored = EntitySystem.deserialize(system.serialize())
+    entity = restored.get_entity(entity.id)
+    assert (entity.name, entity.type, entity.properties) == ("open chest", "trigger", {"collidable": True, "layer": 2})
+    entity.properties["visible"] = False
+    assert restored.revision == 1
+
+def test_serialize_keeps_only_non_default_properties_and_components():
+    system = EntitySystem()
+    system.create_entities([f"coin {i}" for i in range(1000)], np.arange(1000) * 4.0, np.full(1000, 8.0))
+    door = system.create_entity("door", 7.0, 9.0, "trigger")
+    door.properties["collidable"] = True
+    door.add_component(Component("lock", {"key": "red"}))
+    system.get_all_entities()[3].properties  # read only: stays default
+    
+    columns = system.serialize()
+    assert len(columns["id"]) == 1001
+    assert columns["properties"] == {door.id: {"visible": True, "collidable": True, "layer": 1}}
+    assert columns["components"] == {door.id: {"lock": {"key": "red"}}}
+    
+    expected = {entity.id: entity.to_dict() for entity in system.entities.values()}
+    for restored in (EntitySystem.deserialize(columns), EntitySystem.deserialize(list(expected.values()))):
+        assert {entity.id: entity.to_dict() for entity in restored.entities.values()} == expected
+        assert restored.revision == 0 and not restored.dirty_ids
+        assert restored.query_point(7.0, 9.0)[0].id == door.id
+
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication
+from core.history import EditHistory, StrokeRecorder
+from core.project_manager import ProjectManager
+from core.tile_layer import TileLayer, TILE_DTYPE, EMPTY_TILE
+from ui.map_viewport import MapViewport
+
+APP = QApplication.instance() or QApplication([])
+
+def stroke(history: EditHistory, layer: TileLayer, x: int, y: int, tiles: np.ndarray):
+    history.begin_stroke(0, layer)
+    layer.set_region(x, y, tiles)
+    return history.end_stroke()
+
+def test_stroke_recorder_diffs_only_changed_cells():
+    layer = TileLayer("Ground", 100, 100)
+    layer.set(40, 40, 7)
+    recorder = StrokeRecorder(0, layer)
+    layer.before_write = recorder.capture
+    layer.set(1, 1, 3)
+    layer.set(1, 1, 4)     # a second write to the same chunk keeps the first copy
+    layer.set(40, 40, 7)   # unchanged: not captured
+    layer.set(33, 2, 5)
+    layer.set(33, 2, EMPTY_TILE)  # changed and changed back: no delta
+    command = recorder.finish()
+    
+    assert set(recorder.before) == {(0, 0), (1, 0)}
+    assert command.cell_count == 1
+    delta, = command.deltas
+    assert (delta.cx, delta.cy) == (0, 0) and delta.old.tolist() == [0] and delta.new.tolist() == [4]
+    assert StrokeRecorder(0, layer).finish() is None
+
+def test_undo_redo_restores_tiles():
+    rng = np.random.default_rng(0)
+    layer = TileLayer("Ground", 100, 100)
+    history = EditHistory()
+    states = [layer.get_region(0, 0, 100, 100)]
+    for _ in range(5):
+        x, y = rng.integers(0, 80, 2)
+        stroke(history, layer, x, y, rng.integers(0, 4, (30, 30)).astype(TILE_DTYPE))
+        states.append(layer.get_region(0, 0, 100, 100))
+    
+    for expected in reversed(states[:-1]):
+        layer_index, chunks = history.undo([layer])
+        assert layer_index == 0 and chunks
+        assert np.array_equal(layer.get_region(0, 0, 100, 100), expected)
+    assert history.undo([layer]) is None
+    for expected in states[1:]:
+        history.redo([layer])
+        assert np.array_equal(layer.get_region(0, 0, 100, 100), expected)
+    assert history.redo([layer]) is None
+    
+    # A new edit after undo drops the redo stack and its bytes
+    history.undo([layer])
+    stroke(history, layer, 0, 0, np.full((2, 2), 9, dtype=TILE_DTYPE))
+    assert not history.can_redo()
+    assert history.used_bytes == sum(command.nbytes for command in history.undo_stack)
+
+def test_eviction_keeps_newest_within_budget():
+    layer = TileLayer("Ground", 256, 256)
+    history = EditHistory(max_bytes=1)
+    for i in range(3):
+        stroke(history, layer, 0, 0, np.full((64, 64), i + 1, dtype=TILE_DTYPE))
+    assert len(history.undo_stack) == 1
+    assert history.used_bytes == history.undo_stack[0].nbytes
+    
+    history.max_bytes = history.used_bytes * 2
+    stroke(history, layer, 0, 0, np.full((64, 64), 5, dtype=TILE_DTYPE))
+    stroke(history, layer, 0, 0, np.full((64, 64), 6, dtype=TILE_DTYPE))
+    assert len(history.undo_stack) == 2
+    assert history.used_bytes == sum(command.nbytes for command in history.undo_stack)
+    history.undo([layer])
+    history.undo([layer])
+    assert history.undo([layer]) is None
+    assert np.array_equal(layer.get_region(0, 0, 64, 64), np.full((64, 64), 3, dtype=TILE_DTYPE))
+
+def test_undo_for_missing_layer_keeps_command():
+    layer = TileLayer("Ground", 64, 64)
+    history = EditHistory()
+    stroke(history, layer, 0, 0, np.ones((4, 4), dtype=TILE_DTYPE))
+    used = history.used_bytes
+    assert history.undo([]) is None
+    assert len(history.undo_stack) == 1 and history.used_bytes == used
+    history.undo([layer])
+    assert history.redo([]) is None
+    assert len(history.redo_stack) == 1 and history.used_bytes == used
+
+def test_viewport_single_tile_edits_are_undoable():
+    viewport = MapViewport()
+    project = ProjectManager().create_project("Edits", 64, 64)
+    viewport.load_project(project)
+    layer = viewport.get_tile_layer(viewport.current_layer, create=True)
+    viewport.place_tile(3, 4, "grass.png_0_0")
+    viewport.place_tile(5, 4, "grass.png_32_0")
+    viewport.erase_tile(3, 4)
+    assert len(viewport.history.undo_stack) == 3
+    
+    viewport.undo()
+    assert layer.get(3, 4) == project["palette"].id_for("grass.png_0_0")
+    viewport.undo()
+    assert layer.get(5, 4) == EMPTY_TILE
+    viewport.redo()
+    assert layer.get(5, 4) == project["palette"].id_for("grass.png_32_0")
@@ -0,0 +1,104 @@
+import numpy as np
+from core.tile_layer import TileLayer, TileIdPalette, TILE_DTYPE, EMPTY_TILE
+
+W, H, CS = 70, 50, 16
+
+def reference_read(grid: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
+    """Dense read of a rect with out-of-bounds cells as empty"""
+    pad = 100
+    padded = np.zeros((H + 2 * pad, W + 2 * pad), dtype=TILE_DTYPE)
+    padded[pad:pad + H, pad:pad + W] = grid
+    return padded[y + pad:y + pad + h, x + pad:x + pad + w].copy()
+
+def test_get_set_single_cells():
+    layer = TileLayer("Ground", W, H, CS)
+    assert layer.set(17, 3, 5) == EMPTY_TILE
+    assert layer.set(17, 3, 6) == 5
+    assert layer.get(17, 3) == 6 and layer.get(16, 3) == EMPTY_TILE
+    assert list(layer.chunks) == [(1, 0)]
+    for x, y in ((-1, 0), (0, -1), (W, 0), (0, H)):
+        assert layer.set(x, y, 9) == EMPTY_TILE and layer.get(x, y) == EMPTY_TILE
+    assert list(layer.chunks) == [(1, 0)]
+
+def test_regions_match_dense_grid():
+    rng = np.random.default_rng(0)
+    layer = TileLayer("Ground", W, H, CS)
+    grid = np.zeros((H, W), dtype=TILE_DTYPE)
+    for _ in range(300):
+        x, y = rng.integers(-30, W + 10, 2)
+        w, h = rng.integers(0, 40, 2)
+        tiles = rng.integers(0, 5, (h, w)).astype(TILE_DTYPE)
+        mask = rng.random((h, w)) < 0.5 if rng.random() < 0.5 else None
+        before = grid.copy()
+        
+        changed = layer.set_region(x, y, tiles, mask)
+        x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, W), min(y + h, H)
+        if x0 < x1 and y0 < y1:
+            src = tiles[y0 - y:y1 - y, x0 - x:x1 - x]
+            if mask is None:
+                grid[y0:y1, x0:x1] = src
+            else:
+                np.copyto(grid[y0:y1, x0:x1], src, where=mask[y0 - y:y1 - y, x0 - x:x1 - x])
+        
+        # Reported chunks are exactly the ones whose cells changed
+        diff = np.argwhere(grid != before)
+        assert sorted(changed) == sorted({(int(cx) // CS, int(cy) // CS) for cy, cx in diff})
+        rx, ry = rng.integers(-20, W + 5, 2)
+        rw, rh = rng.integers(0, 50, 2)
+        assert np.array_equal(layer.get_region(rx, ry, rw, rh), reference_read(grid, rx, ry, rw, rh))
+    assert np.array_equal(layer.get_region(0, 0, W, H), grid)
+
+def test_fill_region_clips_to_the_layer():
+    layer = TileLayer("Ground", W, H, CS)
+    assert sorted(layer.fill_region(-5, 40, 30, 30, 3)) == [(0, 2), (0, 3), (1, 2), (1, 3)]
+    expected = np.zeros((H, W), dtype=TILE_DTYPE)
+    expected[40:, :25] = 3
+    assert np.array_equal(layer.get_region(0, 0, W, H), expected)
+    assert layer.fill_region(10, 10, -4, 6, 3) == [] and layer.fill_region(W, 0, 5, 5, 3) == []
+    assert layer.get_region(-10, -10, 0, 5).shape == (5, 0)
+
+def test_empty_writes_do_not_allocate_chunks():
+    layer = TileLayer("Ground", W, H, CS)
+    assert layer.set(3, 3, EMPTY_TILE) == EMPTY_TILE
+    assert layer.fill_region(0, 0, W, H, EMPTY_TILE) == []
+    tiles = np.full((20, 20), 7, dtype=TILE_DTYPE)
+    assert layer.set_region(0, 0, tiles, np.zeros((20, 20), dtype=bool)) == []
+    assert layer.get_region(0, 0, W, H).sum() == 0
+    assert not layer.chunks
+    
+    # A masked write allocates only the chunks its unmasked cells reach
+    mask = np.zeros((20, 20), dtype=bool)
+    mask[18, 18] = True
+    assert layer.set_region(0, 0, tiles, mask) == [(1, 1)]
+    assert list(layer.chunks) == [(1, 1)]
+
+def test_dirty_and_revision_tracking():
+    layer = TileLayer("Ground", W, H, CS)
+    layer.fill_region(0, 0, 20, 4, 2)
+    assert sorted(layer.dirty_chunks()) == [(0, 0), (1, 0)]
+    revisions = {key: chunk.revision for key, chunk in layer.chunks.items()}
+    layer.mark_clean()
+    assert layer.dirty_chunks() == []
+    
+    # Writing what is already there changes nothing
+    assert layer.fill_region(0, 0, 20, 4, 2) == []
+    assert layer.set(1, 1, 2) == 2
+    assert layer.dirty_chunks() == [] and all(layer.chunks[k].revision == r for k, r in revisions.items())
+    
+    layer.set(17, 2, 9)
+    assert layer.dirty_chunks() == [(1, 0)]
+    assert layer.chunks[(1, 0)].revision == revisions[(1, 0)] + 1
+    assert layer.chunks[(0, 0)].revision == revisions[(0, 0)]
+
+def test_dict_round_trip_skips_empty_chunks():
+    layer = TileLayer("Ground", W, H, CS)
+    layer.fill_region(30, 30, 10, 10, 4)
+    layer.set(0, 0, 1)
+    layer.set(0, 0, EMPTY_TILE)
+    restored = TileLayer.from_dict(layer.to_dict(), W, H)
+    assert set(restored.chunks) == set(layer.chunks) - {(0, 0)}
+    assert np.array_equal(restored.get_region(0, 0, W, H), layer.get_region(0, 0, W, H))
+    
+    palette = TileIdPalette(["a", "b"])
+    assert (palette.id_for("b"), palette.id_for("c"), palette.key_for(0), palette.key_for(9)) == (2, 3, None, None)
+    assert TileIdPalette.from_list(palette.to_list()).ids == palette.ids
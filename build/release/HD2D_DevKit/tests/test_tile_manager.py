@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from PIL import Image
+from core.tile_manager import TileManager
+
+def write_tileset(path, seed: int, pixels: int = 64):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (pixels, pixels, 4), dtype=np.uint8), "RGBA").save(path)
+
+def cache_entries(tile_manager: TileManager) -> list:
+    return sorted(path.name for path in tile_manager.cache_dir.iterdir())
+
+def test_slice_cache_round_trip(work_dir):
+    path = str(work_dir / "grass.png")
+    write_tileset(path, 0)
+    first = TileManager()
+    first.load_tileset("grass.png", path, 32)
+    pixels = first.load_pixels("grass.png")
+    
+    # A fresh manager finds the decoded pixels without opening the image
+    second = TileManager()
+    second.load_tileset("grass.png", path, 32)
+    second.decode_atlas = None
+    assert np.array_equal(second.load_pixels("grass.png"), pixels)
+
+def test_slice_cache_drops_outdated_tileset_versions(work_dir):
+    path = str(work_dir / "grass.png")
+    tile_manager = TileManager()
+    for seed in range(3):
+        write_tileset(path, seed)
+        tile_manager.load_tileset("grass.png", path, 32)
+        tile_manager.load_pixels("grass.png")
+    key = tile_manager.tilesets["grass.png"]["cache_key"]
+    assert cache_entries(tile_manager) == [f"{key}.json", f"{key}.rgba.z"]
+    
+    # Another tile size of the same image is a separate entry
+    tile_manager.load_tileset("grass.png", path, 16)
+    tile_manager.load_pixels("grass.png")
+    assert len(cache_entries(tile_manager)) == 4
+
+def test_slice_cache_stays_under_budget(work_dir):
+    tile_manager = TileManager(cache_bytes=1)
+    for seed, name in enumerate(("a.png", "b.png", "c.png")):
+        path = str(work_dir / name)
+        write_tileset(path, seed)
+        tile_manager.load_tileset(name, path, 32)
+        tile_manager.load_pixels(name)
+    # Only the newest entry is kept once the budget is exceeded
+    key = tile_manager.tilesets["c.png"]["cache_key"]
+    assert cache_entries(tile_manager) == [f"{key}.json", f"{key}.rgba.z"]
+    assert os.path.getsize(tile_manager.cache_dir / f"{key}.rgba.z") > 0
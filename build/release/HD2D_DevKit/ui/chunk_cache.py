@@ -0,0 +1,222 @@
+import time
+from collections import OrderedDict
+from PyQt6.QtCore import QPointF
+from PyQt6.QtGui import QPixmap, QPainter, QImage
+import numpy as np
+from core.tile_layer import EMPTY_TILE
+
+PLACEHOLDER_COLOR = (100, 150, 200, 255)
+MAX_PIXMAP_PX = 2048  # longest side of a chunk pixmap; closer zooms draw it scaled up
+
+def image_pixels(image: QImage) -> np.ndarray:
+    """Copy a QImage into an (h, w, 4) RGBA array"""
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    h, w = image.height(), image.width()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(h, image.bytesPerLine())
+    return rows[:, :w * 4].reshape(h, w, 4).copy()
+
+def scale_tiles(tiles: np.ndarray, tile_px: int) -> np.ndarray:
+    """Resize (n, h, w, 4) tiles to tile_px square, averaging blocks when shrinking by a whole factor"""
+    n, h, w = tiles.shape[:3]
+    if h == w == tile_px:
+        return tiles
+    if h == w and h % tile_px == 0:
+        f = h // tile_px
+        blocks = tiles.reshape(n, tile_px, f, tile_px, f, 4).astype(np.float32)
+        alpha = blocks[..., 3].sum(axis=(2, 4))
+        # Weight colours by alpha so transparent pixels don't darken the average
+        rgb = (blocks[..., :3] * blocks[..., 3:]).sum(axis=(2, 4)) / np.maximum(alpha, 1)[..., None]
+        return np.concatenate([rgb, (alpha / (f * f))[..., None]], axis=-1).round().astype(np.uint8)
+    rows, cols = np.arange(tile_px) * h // tile_px, np.arange(tile_px) * w // tile_px
+    return tiles[:, rows][:, :, cols]
+
+class ChunkPixmapCache:
+    """LRU cache of pre-composited chunk pixmaps and their tile tables, bounded by a byte budget"""
+    
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0  # pixmaps and tile tables
+        self.table_bytes = 0
+        self.palette = None
+        self.tile_source = None  # callable(tile_key) -> QImage or None
+        self.hits = 0
+        self.misses = 0
+        self.deferred = 0  # misses left unrendered by get(render=False)
+        self.render_time = 0.0  # seconds spent rendering misses; callers reset both per frame
+        
+        # tile_px -> [pixels indexed by palette id at that size, mask of ids resolved so far]
+        self.tile_tables = {}
+        # (layer, cx, cy, tile_px) -> [revision, pixmap]
+        self.entries = OrderedDict()
+        # (layer, cx, cy) -> set of cached tile_px sizes
+        self.by_chunk = {}
+    
+    def clear(self):
+        """Drop every pixmap and tile table (new palette or reloaded tilesets)"""
+        self.entries.clear()
+        self.by_chunk.clear()
+        self.tile_tables.clear()
+        self.used_bytes = self.table_bytes = 0
+    
+    def get(self, layer_index: int, tile_layer, cx: int, cy: int, tile_px: int, render: bool = True) -> QPixmap:
+        """Return the pixmap for a chunk, rendering it only if missing or stale
+        
+        With render=False a miss is counted in deferred and answered with the
+        chunk's closest up-to-date pixmap at another size, if there is one.
+        tile_px is capped so the pixmap stays within MAX_PIXMAP_PX.
+        """
+        chunk = tile_layer.chunks.get((cx, cy))
+        if chunk is None:
+            return None
+        tile_px = min(tile_px, max(MAX_PIXMAP_PX // tile_layer.chunk_size, 1))
+        
+        key = (layer_index, cx, cy, tile_px)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == chunk.revision:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        
+        if not render:
+            self.deferred += 1
+            sizes = [size for size in self.by_chunk.get(key[:3], ())
+                     if self.entries[key[:3] + (size,)][0] == chunk.revision]
+            if not sizes:
+                return None
+            return self.entries[key[:3] + (min(sizes, key=lambda size: abs(size - tile_px)),)][1]
+        
+        self.misses += 1
+        started = time.perf_counter()
+        pixels = self.render_block(chunk.tiles, tile_px)
+        h, w = pixels.shape[:2]
+        pixmap = QPixmap.fromImage(QImage(pixels.data, w, h, w * 4, QImage.Format.Format_RGBA8888))
+        self.store(key, chunk.revision, pixmap)
+        self.render_time += time.perf_counter() - started
+        return pixmap
+    
+    def store(self, key: tuple, revision: int, pixmap: QPixmap):
+        """Insert a pixmap and evict least recently used entries over budget"""
+        self.discard(key)
+        self.entries[key] = [revision, pixmap]
+        self.by_chunk.setdefault(key[:3], set()).add(key[3])
+        self.used_bytes += self.pixmap_bytes(pixmap)
+        
+        while self.used_bytes > self.max_bytes and len(self.entries) > 1:
+            self.discard(next(iter(self.entries)))
+        if self.used_bytes > self.max_bytes:
+            # Tables of other sizes are rebuilt on demand
+            for tile_px in [size for size in self.tile_tables if size != key[3]]:
+                self.drop_table(tile_px)
+    
+    def drop_table(self, tile_px: int):
+        table = self.tile_tables.pop(tile_px, None)
+        if table is not None:
+            self.table_bytes -= table[0].nbytes
+            self.used_bytes -= table[0].nbytes
+    
+    def discard(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.used_bytes -= self.pixmap_bytes(entry[1])
+        sizes = self.by_chunk.get(key[:3])
+        if sizes is not None:
+            sizes.discard(key[3])
+            if not sizes:
+                del self.by_chunk[key[:3]]
+    
+    def discard_chunk(self, layer_index: int, cx: int, cy: int):
+        for tile_px in list(self.by_chunk.get((layer_index, cx, cy), ())):
+            self.discard((layer_index, cx, cy, tile_px))
+    
+    def discard_layer(self, layer_index: int):
+        for key in [k for k in self.entries if k[0] == layer_index]:
+            self.discard(key)
+    
+    def patch_region(self, layer_index: int, tile_layer, x: int, y: int, w: int, h: int):
+        """Repaint an edited map rect into cached pixmaps of the touched chunks
+        
+        Must be called right after the edit, so each chunk is exactly one revision
+        ahead of its cached pixmaps; anything else is dropped and re-rendered lazily.
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, tile_layer.width), min(y + h, tile_layer.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        
+        for cx, cy, local, region in tile_layer.iter_chunk_slices(x0, y0, x1, y1):
+            chunk = tile_layer.chunks.get((cx, cy))
+            for tile_px in list(self.by_chunk.get((layer_index, cx, cy), ())):
+                key = (layer_index, cx, cy, tile_px)
+                entry = self.entries[key]
+                if chunk is None or entry[0] != chunk.revision - 1:
+                    self.discard(key)
+                    continue
+                painter = QPainter(entry[1])
+                self.paint_cells(painter, chunk.tiles[local], local[1].start, local[0].start, tile_px)
+                painter.end()
+                entry[0] = chunk.revision
+    
+    def paint_cells(self, painter: QPainter, block: np.ndarray, lx: int, ly: int, tile_px: int):
+        """Paint a block of tile ids with its top-left cell at local chunk cell (lx, ly)"""
+        pixels = self.render_block(block, tile_px)
+        h, w = pixels.shape[:2]
+        # Source mode replaces the old cells, so erased tiles become transparent
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.drawImage(QPointF(lx * tile_px, ly * tile_px),
+                          QImage(pixels.data, w, h, w * 4, QImage.Format.Format_RGBA8888))
+    
+    def render_block(self, block: np.ndarray, tile_px: int) -> np.ndarray:
+        """RGBA pixels of a block of tile ids, gathered from the tile table in one pass"""
+        h, w = block.shape
+        tiles = self.tile_table(tile_px, block)[block]
+        return tiles.transpose(0, 2, 1, 3, 4).reshape(h * tile_px, w * tile_px, 4)
+    
+    def tile_table(self, tile_px: int, block: np.ndarray) -> np.ndarray:
+        """Pixels of palette ids at tile_px, indexed by id; ids in block are resolved on first use"""
+        count = int(block.max()) + 1 if block.size else 1
+        table = self.tile_tables.get(tile_px)
+        if table is None or len(table[0]) < count:
+            size = max(count, 2 * len(table[0]) if table else 256)
+            pixels = np.zeros((size, tile_px, tile_px, 4), dtype=np.uint8)
+            resolved = np.zeros(size, dtype=bool)
+            resolved[EMPTY_TILE] = True
+            if table is not None:
+                pixels[:len(table[0])], resolved[:len(table[1])] = table
+                self.drop_table(tile_px)
+            table = self.tile_tables[tile_px] = [pixels, resolved]
+            self.table_bytes += pixels.nbytes
+            self.used_bytes += pixels.nbytes
+        
+        pixels, resolved = table
+        ids = np.unique(block)
+        ids = ids[~resolved[ids]]
+        if len(ids):
+            pixels[ids] = self.resolve_tiles(ids.tolist(), tile_px)
+            resolved[ids] = True
+        return pixels
+    
+    def resolve_tiles(self, tile_ids: list, tile_px: int) -> np.ndarray:
+        """Tiles scaled to tile_px, batched by source size; tiles without an image get the placeholder colour"""
+        resolved = np.empty((len(tile_ids), tile_px, tile_px, 4), dtype=np.uint8)
+        resolved[:] = PLACEHOLDER_COLOR
+        if self.tile_source is None or self.palette is None:
+            return resolved
+        
+        by_shape = {}  # source tile shape -> (indexes into tile_ids, pixels)
+        for index, tile_id in enumerate(tile_ids):
+            image = self.tile_source(self.palette.key_for(tile_id))
+            if image is not None:
+                tile = image_pixels(image)
+                indexes, tiles = by_shape.setdefault(tile.shape, ([], []))
+                indexes.append(index)
+                tiles.append(tile)
+        for indexes, tiles in by_shape.values():
+            resolved[indexes] = scale_tiles(np.stack(tiles), tile_px)
+        return resolved
+    
+    @staticmethod
+    def pixmap_bytes(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 32) // 8
@@ -1,14 +1,19 @@
 from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, 
                            QMenuBar, QMenu, QToolBar, QFileDialog, QMessageBox,
                            QDockWidget, QSplitter, QStatusBar)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from core.autosave import AutosaveService
+from core.profiler import PROFILER
 from .map_viewport import MapViewport
 from .tile_palette import TilePalette
 from .layer_panel import LayerPanel
 from .properties_panel import PropertiesPanel
 from .toolbar import EditorToolbar
+from .profiler_overlay import ProfilerOverlay
 
 class MainWindow(QMainWindow):
+    save_completed = pyqtSignal(object)
+    
     def __init__(self, project_manager):
         super().__init__()
         self.project_manager = project_manager
@@ -19,6 +24,7 @@ class MainWindow(QMainWindow):
         self.setup_menu()
         self.setup_toolbar()
         self.setup_status_bar()
+        self.setup_autosave()
     
     def setup_ui(self):
         # Create central widget with splitter
@@ -26,32 +32,39 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
         
         main_splitter = QSplitter(Qt.Orientation.Horizontal)
+        central_layout = QHBoxLayout(central_widget)
+        central_layout.setContentsMargins(0, 0, 0, 0)
+        central_layout.addWidget(main_splitter)
         
         # Left panel - Tile Palette
         self.tile_palette = TilePalette()
-        tile_dock = QDockWidget("Tile Palette", self)
-        tile_dock.setWidget(self.tile_palette)
-        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, tile_dock)
+        self.tile_dock = QDockWidget("Tile Palette", self)
+        self.tile_dock.setWidget(self.tile_palette)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.tile_dock)
         
         # Center - Map Viewport
         self.map_viewport = MapViewport()
         main_splitter.addWidget(self.map_viewport)
+        self.map_viewport.chunk_cache.tile_source = self.tile_palette.tile_manager.get_tile_by_id
+        self.tile_palette.tile_selected.connect(self.map_viewport.set_selected_tile)
+        self.tile_palette.tileset_loaded.connect(self.map_viewport.reload_tiles)
+        self.profiler_overlay = ProfilerOverlay(self.map_viewport, self.tile_palette.tile_manager)
         
         # Right panel - Layers & Properties
         right_splitter = QSplitter(Qt.Orientation.Vertical)
         
         self.layer_panel = LayerPanel()
-        layer_dock = QDockWidget("Layers", self)
-        layer_dock.setWidget(self.layer_panel)
-        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, layer_dock)
+        self.layer_dock = QDockWidget("Layers", self)
+        self.layer_dock.setWidget(self.layer_panel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.layer_dock)
         
         self.properties_panel = PropertiesPanel()
-        props_dock = QDockWidget("Properties", self)
-        props_dock.setWidget(self.properties_panel)
-        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, props_dock)
+        self.props_dock = QDockWidget("Properties", self)
+        self.props_dock.setWidget(self.properties_panel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.props_dock)
         
-        self.tabifyDockWidget(layer_dock, props_dock)
-        layer_dock.raise_()
+        self.tabifyDockWidget(self.layer_dock, self.props_dock)
+        self.layer_dock.raise_()
     
     def setup_menu(self):
         menubar = self.menuBar()
@@ -78,9 +91,12 @@ class MainWindow(QMainWindow):
         
         undo_action = edit_menu.addAction("&Undo")
         undo_action.setShortcut("Ctrl+Z")
+        # Profiled slots take *args, so Qt would pass them the action's checked flag
+        undo_action.triggered.connect(lambda: self.map_viewport.undo())
         
         redo_action = edit_menu.addAction("&Redo")
         redo_action.setShortcut("Ctrl+Y")
+        redo_action.triggered.connect(lambda: self.map_viewport.redo())
         
         # Tools Menu
         tools_menu = menubar.addMenu("&Tools")
@@ -89,21 +105,44 @@ class MainWindow(QMainWindow):
         grid_toggle.setShortcut("G")
         grid_toggle.triggered.connect(self.map_viewport.toggle_grid)
         
+        dump_profile = tools_menu.addAction("&Dump Profile...")
+        dump_profile.triggered.connect(self.dump_profile)
+        
         # View Menu
         view_menu = menubar.addMenu("&View")
-        view_menu.addAction(layer_dock.toggleViewAction())
-        view_menu.addAction(props_dock.toggleViewAction())
-        view_menu.addAction(tile_dock.toggleViewAction())
+        view_menu.addAction(self.layer_dock.toggleViewAction())
+        view_menu.addAction(self.props_dock.toggleViewAction())
+        view_menu.addAction(self.tile_dock.toggleViewAction())
+        view_menu.addSeparator()
+        
+        # Opt-in: timers cost nothing until this is switched on (or HD2D_PROFILE=1 is set)
+        profiling = view_menu.addAction("&Profiling Overlay")
+        profiling.setShortcut("F12")
+        profiling.setCheckable(True)
+        profiling.toggled.connect(self.profiler_overlay.set_active)
+        profiling.setChecked(PROFILER.enabled)
     
     def setup_toolbar(self):
         self.toolbar = EditorToolbar()
         self.addToolBar(self.toolbar)
+        self.toolbar.tool_changed.connect(self.map_viewport.set_tool)
+        self.toolbar.brush_size_changed.connect(self.map_viewport.set_brush_size)
     
     def setup_status_bar(self):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready - No project loaded")
     
+    def setup_autosave(self):
+        # Results arrive on the autosave worker thread; the signal hands them to the GUI thread
+        self.save_completed.connect(self.on_save_completed)
+        self.autosave = AutosaveService(self.project_manager, on_saved=self.save_completed.emit)
+        
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(60 * 1000)
+        self.autosave_timer.timeout.connect(self.autosave.save)
+        self.autosave_timer.start()
+    
     def new_project(self):
         from PyQt6.QtWidgets import QDialog, QFormLayout, QSpinBox, QLineEdit, QDialogButtonBox
         
@@ -138,12 +177,15 @@ class MainWindow(QMainWindow):
         dialog.setLayout(layout)
         
         if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.autosave.save()
+            self.autosave.flush()
             project = self.project_manager.create_project(
                 name_edit.text(),
                 width_spin.value(),
                 height_spin.value(),
                 tile_size_spin.value()
             )
+            self.autosave.reset(project)
             self.map_viewport.load_project(project)
             self.status_bar.showMessage(f"Project '{project['name']}' created")
     
@@ -152,11 +194,41 @@ class MainWindow(QMainWindow):
             self, "Open Project", "assets/projects", "HD2D Files (*.h2d)"
         )
         if file_path:
+            self.autosave.save()
+            self.autosave.flush()
             project = self.project_manager.load_project(file_path)
+            self.autosave.reset(project)
             self.map_viewport.load_project(project)
             self.status_bar.showMessage(f"Loaded project: {project['name']}")
     
     def save_project(self):
         if self.project_manager.current_project:
-            self.project_manager.save_project(self.project_manager.current_project)
-            self.status_bar.showMessage("Project saved successfully")
+            if not self.autosave.save():
+                self.status_bar.showMessage("No changes to save")
+    
+    def dump_profile(self):
+        """Write the per-operation timers to a JSON file"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Dump Profile", "profile.json", "JSON Files (*.json)"
+        )
+        if file_path:
+            PROFILER.dump(file_path)
+            self.status_bar.showMessage(f"Profile written to {file_path}")
+    
+    def on_save_completed(self, result: dict):
+        """Report save latency and size in the status bar"""
+        if result["error"]:
+            self.status_bar.showMessage(f"Save failed: {result['error']}")
+            return
+        
+        message = (f"Saved {result['chunks']} chunks, {result['bytes'] / 1024:.1f} KB "
+                   f"in {result['latency_ms']:.0f} ms (UI blocked {result['snapshot_ms']:.1f} ms)")
+        if result["compacted"]:
+            message += " - project file compacted"
+        self.status_bar.showMessage(message)
+    
+    def closeEvent(self, event):
+        """Write pending changes before the window closes"""
+        self.autosave.save()
+        self.autosave.flush()
+        super().closeEvent(event)
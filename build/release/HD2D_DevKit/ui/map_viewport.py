@@ -1,10 +1,29 @@
 from PyQt6.QtWidgets import QWidget, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem
-from PyQt6.QtCore import Qt, QRectF, QPointF, pyqtSignal
-from PyQt6.QtGui import QPixmap, QPen, QBrush, QColor, QMouseEvent, QWheelEvent
+from PyQt6.QtCore import Qt, QRectF, QPointF, QLineF, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap, QPen, QBrush, QColor, QMouseEvent, QWheelEvent, QPainter
+import math
 import numpy as np
+from core.tile_layer import TileLayer, EMPTY_TILE, TILE_DTYPE
+from core.history import EditHistory
+from core.profiler import profiled
+from core.edit_tools import (
+    brush_pattern, ellipse_mask, flood_fill_mask, polyline_cells, rect_mask, stamp_pattern
+)
+from .chunk_cache import ChunkPixmapCache
+
+EDIT_TOOLS = ("paint", "erase", "fill", "rect", "ellipse", "stamp")
+STROKE_TOOLS = ("paint", "erase", "stamp")
+
+# Edits up to this many cells are patched into cached chunk pixmaps; larger
+# ones drop the affected pixmaps so only visible chunks are re-rendered
+PATCH_CELLS = 4096
+
+# Seconds per frame spent rendering missing chunk pixmaps; the rest wait for later frames
+RENDER_BUDGET = 0.008
 
 class MapViewport(QGraphicsView):
     tile_placed = pyqtSignal(int, int, str)
+    tiles_changed = pyqtSignal(int, int, int, int, int)  # layer, x, y, w, h
     entity_selected = pyqtSignal(str)
     
     def __init__(self):
@@ -16,19 +35,38 @@ class MapViewport(QGraphicsView):
         self.grid_size = 32
         self.show_grid = True
         self.current_layer = 0
-        self.current_tool = "paint"  # paint, erase, select
+        self.current_tool = "paint"  # paint, erase, select, fill, rect, ellipse, stamp
         self.selected_tile = None
+        self.brush_size = 1
+        self.stamp = None  # tile ids copied with Shift+drag in the stamp tool
+        
+        # Drag state; stroke positions are coalesced and applied once per frame
+        self.stroke_points = []
+        self.stroke_last = None
+        self.drag_origin = None
+        self.drag_current = None
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(16)
+        self.frame_timer.timeout.connect(self.flush_stroke)
+        
+        # Repaints until chunks skipped by the render budget have all been drawn
+        self.render_pending = False
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(0)
+        self.render_timer.timeout.connect(self.viewport().update)
         
         # Map data
         self.map_data = None
-        self.layers = []
-        self.grid_lines = []
+        self.chunk_cache = ChunkPixmapCache()
+        self.history = EditHistory()
         
         # View settings
         self.zoom_level = 1.0
         self.setRenderHint(self.renderHints().Antialiasing)
         self.setOptimizationFlag(self.OptimizationFlag.DontSavePainterState)
-        self.setViewportUpdateMode(self.ViewportUpdateMode.FullViewportUpdate)
+        self.setViewportUpdateMode(self.ViewportUpdateMode.MinimalViewportUpdate)
         
         # Background
         self.scene.setBackgroundBrush(QBrush(QColor(30, 30, 30)))
@@ -39,47 +77,130 @@ class MapViewport(QGraphicsView):
         """Initialize the scene with grid"""
         self.draw_grid()
     
+    @profiled()
     def draw_grid(self):
-        """Draw the grid overlay"""
-        # Clear existing grid lines
-        for line in self.grid_lines:
-            self.scene.removeItem(line)
-        self.grid_lines.clear()
+        """Schedule a repaint of the grid overlay"""
+        self.invalidateScene(self.sceneRect(), QGraphicsScene.SceneLayer.ForegroundLayer)
+    
+    def level_of_detail(self) -> int:
+        """Pixel size to render tiles at for the current zoom (power of two, at most grid_size)"""
+        screen_px = self.grid_size * self.transform().m11()
+        tile_px = 1
+        while tile_px < screen_px and tile_px < self.grid_size:
+            tile_px *= 2
+        return min(tile_px, self.grid_size)
+    
+    def visible_chunk_range(self, tile_layer: TileLayer, rect: QRectF):
+        """Return the (cx0, cy0, cx1, cy1) inclusive chunk range intersecting a scene rect"""
+        span = tile_layer.chunk_size * self.grid_size
+        max_cx = (tile_layer.width - 1) // tile_layer.chunk_size
+        max_cy = (tile_layer.height - 1) // tile_layer.chunk_size
+        cx0 = max(0, math.floor(rect.left() / span))
+        cy0 = max(0, math.floor(rect.top() / span))
+        cx1 = min(max_cx, math.floor(rect.right() / span))
+        cy1 = min(max_cy, math.floor(rect.bottom() / span))
+        return cx0, cy0, cx1, cy1
+    
+    @profiled("MapViewport.frame")
+    def paintEvent(self, event):
+        """Paint the viewport; timed as one frame when profiling"""
+        super().paintEvent(event)
+    
+    @profiled()
+    def drawBackground(self, painter: QPainter, rect: QRectF):
+        """Draw the cached pixmaps of the chunks intersecting the exposed rect
+        
+        Missing pixmaps are rendered until the frame's budget runs out; the rest
+        show a cached pixmap at another level of detail and are rendered in the
+        next frames.
+        """
+        super().drawBackground(painter, rect)
+        if not self.map_data:
+            return
+        
+        tile_px = self.level_of_detail()
+        cache = self.chunk_cache
+        cache.deferred = 0
+        cache.render_time = 0.0
+        for layer_index, tile_layer in enumerate(self.map_data.get("layers", [])):
+            if not tile_layer.visible or not tile_layer.chunks:
+                continue
+            
+            cx0, cy0, cx1, cy1 = self.visible_chunk_range(tile_layer, rect)
+            span = tile_layer.chunk_size * self.grid_size
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(tile_layer.chunks):
+                coords = [c for c in tile_layer.chunks if cx0 <= c[0] <= cx1 and cy0 <= c[1] <= cy1]
+            else:
+                coords = [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+            
+            for cx, cy in coords:
+                pixmap = cache.get(layer_index, tile_layer, cx, cy, tile_px, cache.render_time < RENDER_BUDGET)
+                if pixmap is not None:
+                    painter.drawPixmap(QRectF(cx * span, cy * span, span, span), pixmap, QRectF(pixmap.rect()))
+        
+        self.render_pending = cache.deferred > 0
+        if self.render_pending:
+            self.render_timer.start()
+    
+    @profiled()
+    def drawForeground(self, painter: QPainter, rect: QRectF):
+        """Paint the grid procedurally for the exposed rect"""
+        if self.drag_origin is not None:
+            self.draw_drag_preview(painter)
         
         if not self.show_grid or not self.map_data:
             return
         
-        pen = QPen(QColor(60, 60, 60))
-        pen.setWidth(1)
+        # Skip the grid when cells are too small on screen to be useful
+        if self.grid_size * self.transform().m11() < 4:
+            return
         
         width = self.map_data["width"] * self.grid_size
         height = self.map_data["height"] * self.grid_size
+        left, top = max(rect.left(), 0), max(rect.top(), 0)
+        right, bottom = min(rect.right(), width), min(rect.bottom(), height)
+        if left > right or top > bottom:
+            return
         
-        # Vertical lines
-        for x in range(0, width + 1, self.grid_size):
-            line = self.scene.addLine(x, 0, x, height, pen)
-            self.grid_lines.append(line)
+        lines = []
+        first_x = math.ceil(left / self.grid_size) * self.grid_size
+        for x in range(int(first_x), int(right) + 1, self.grid_size):
+            lines.append(QLineF(x, top, x, bottom))
+        first_y = math.ceil(top / self.grid_size) * self.grid_size
+        for y in range(int(first_y), int(bottom) + 1, self.grid_size):
+            lines.append(QLineF(left, y, right, y))
         
-        # Horizontal lines
-        for y in range(0, height + 1, self.grid_size):
-            line = self.scene.addLine(0, y, width, y, pen)
-            self.grid_lines.append(line)
+        pen = QPen(QColor(60, 60, 60))
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.drawLines(lines)
+    
+    def draw_drag_preview(self, painter: QPainter):
+        """Outline the rect, ellipse or stamp area being dragged"""
+        x, y, w, h = self.drag_rect()
+        pen = QPen(QColor(255, 200, 0))
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        outline = QRectF(x * self.grid_size, y * self.grid_size, w * self.grid_size, h * self.grid_size)
+        if self.current_tool == "ellipse":
+            painter.drawEllipse(outline)
+        else:
+            painter.drawRect(outline)
     
+    @profiled()
     def load_project(self, project: dict):
         """Load a project into the viewport"""
         self.map_data = project
         self.grid_size = project.get("tile_size", 32)
         
-        # Clear scene
+        # Clear scene and cached chunks
         self.scene.clear()
-        self.layers.clear()
-        self.grid_lines.clear()
-        
-        # Create layers
-        for i, layer_data in enumerate(project.get("layers", [])):
-            layer = self.scene.createItemGroup([])
-            layer.setZValue(i)
-            self.layers.append(layer)
+        self.chunk_cache.clear()
+        self.chunk_cache.palette = project["palette"]
+        self.history.clear()
+        self.stroke_points = []
+        self.stroke_last = self.drag_origin = self.drag_current = None
         
         # Draw grid
         self.draw_grid()
@@ -91,43 +212,165 @@ class MapViewport(QGraphicsView):
         
         self.fitInView(self.scene.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
     
+    def reload_tiles(self):
+        """Re-render chunks with the current tileset images, replacing placeholders and stale tiles"""
+        self.chunk_cache.clear()
+        self.viewport().update()
+    
     def toggle_grid(self):
         """Toggle grid visibility"""
         self.show_grid = not self.show_grid
         self.draw_grid()
     
+    def grid_pos(self, event: QMouseEvent):
+        scene_pos = self.mapToScene(event.position().toPoint())
+        return int(scene_pos.x() // self.grid_size), int(scene_pos.y() // self.grid_size)
+    
     def mousePressEvent(self, event: QMouseEvent):
-        """Handle mouse clicks for painting"""
+        """Start a stroke, shape drag or fill at the clicked cell"""
         if not self.map_data or event.button() != Qt.MouseButton.LeftButton:
             super().mousePressEvent(event)
             return
         
-        scene_pos = self.mapToScene(event.position().toPoint())
-        grid_x = int(scene_pos.x() // self.grid_size)
-        grid_y = int(scene_pos.y() // self.grid_size)
+        grid_x, grid_y = self.grid_pos(event)
+        
+        if self.current_tool in EDIT_TOOLS:
+            # Everything painted until the button is released is one undo step
+            self.history.begin_stroke(self.current_layer, self.get_tile_layer(self.current_layer, create=True))
         
-        if self.current_tool == "paint" and self.selected_tile:
-            self.place_tile(grid_x, grid_y, self.selected_tile)
-        elif self.current_tool == "erase":
-            self.erase_tile(grid_x, grid_y)
+        copy_stamp = self.current_tool == "stamp" and event.modifiers() & Qt.KeyboardModifier.ShiftModifier
+        if self.current_tool in STROKE_TOOLS and not copy_stamp:
+            self.stroke_points = [(grid_x, grid_y)]
+            self.stroke_last = None
+            self.flush_stroke()
+        elif self.current_tool in ("rect", "ellipse") or copy_stamp:
+            self.drag_origin = self.drag_current = (grid_x, grid_y)
+            self.draw_grid()
+        elif self.current_tool == "fill":
+            self.flood_fill(grid_x, grid_y)
+        elif self.current_tool == "select":
+            self.select_entity_at(self.mapToScene(event.position().toPoint()))
         
         super().mousePressEvent(event)
     
     def mouseMoveEvent(self, event: QMouseEvent):
-        """Handle mouse drag for continuous painting"""
+        """Queue drag positions; they are applied at most once per frame"""
         if not self.map_data or event.buttons() != Qt.MouseButton.LeftButton:
             super().mouseMoveEvent(event)
             return
         
-        scene_pos = self.mapToScene(event.position().toPoint())
-        grid_x = int(scene_pos.x() // self.grid_size)
-        grid_y = int(scene_pos.y() // self.grid_size)
-        
-        if self.current_tool == "paint" and self.selected_tile:
-            self.place_tile(grid_x, grid_y, self.selected_tile)
+        cell = self.grid_pos(event)
+        if self.drag_origin is not None:
+            if cell != self.drag_current:
+                self.drag_current = cell
+                self.draw_grid()
+        elif self.stroke_last is not None:
+            if cell != (self.stroke_points[-1] if self.stroke_points else self.stroke_last):
+                self.stroke_points.append(cell)
+                if not self.frame_timer.isActive():
+                    self.frame_timer.start()
         
         super().mouseMoveEvent(event)
     
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        """Apply any pending stroke or shape and close the undo step"""
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.frame_timer.stop()
+            self.flush_stroke()
+            self.stroke_last = None
+            if self.drag_origin is not None:
+                self.finish_drag()
+            self.history.end_stroke()
+        super().mouseReleaseEvent(event)
+    
+    def stroke_pattern(self):
+        """The (ids, mask) pattern painted at each cell of a stroke, and its offset from the cursor"""
+        if self.current_tool == "stamp":
+            if self.stamp is None:
+                return None
+            return self.stamp, self.stamp != EMPTY_TILE, 0
+        if self.current_tool == "paint":
+            if not self.selected_tile:
+                return None
+            tile_id = self.map_data["palette"].id_for(self.selected_tile)
+        else:
+            tile_id = EMPTY_TILE
+        ids, mask = brush_pattern(self.brush_size, tile_id)
+        return ids, mask, self.brush_size // 2
+    
+    def flush_stroke(self):
+        """Paint every cell between the queued drag positions in one region write"""
+        points, self.stroke_points = self.stroke_points, []
+        if not points or not self.map_data:
+            return
+        pattern = self.stroke_pattern()
+        if pattern is None:
+            return
+        ids, mask, offset = pattern
+        
+        # Interpolate from the last applied position so fast drags leave no gaps
+        path = points if self.stroke_last is None else [self.stroke_last] + points
+        self.stroke_last = points[-1]
+        xs, ys = polyline_cells(path)
+        stamped = stamp_pattern(xs - offset, ys - offset, ids, mask, self.map_data["width"], self.map_data["height"])
+        if stamped is not None:
+            self.apply_block(*stamped)
+    
+    def drag_rect(self):
+        """Inclusive (x, y, w, h) cell rect spanned by the current drag"""
+        (x0, y0), (x1, y1) = self.drag_origin, self.drag_current
+        return min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1
+    
+    def finish_drag(self):
+        """Fill the dragged rect or ellipse, or copy it as the stamp pattern"""
+        x, y, w, h = self.drag_rect()
+        self.drag_origin = self.drag_current = None
+        self.draw_grid()
+        
+        tile_layer = self.get_tile_layer(self.current_layer, create=True)
+        if self.current_tool == "stamp":
+            self.stamp = tile_layer.get_region(x, y, w, h)
+            return
+        if not self.selected_tile:
+            return
+        
+        tile_id = self.map_data["palette"].id_for(self.selected_tile)
+        mask = rect_mask(w, h) if self.current_tool == "rect" else ellipse_mask(w, h)
+        self.apply_block(x, y, np.full((h, w), tile_id, dtype=TILE_DTYPE), mask)
+    
+    @profiled()
+    def flood_fill(self, x: int, y: int):
+        """Fill the connected area of identical tiles around a cell with the selected tile"""
+        if not self.selected_tile or x < 0 or y < 0 or x >= self.map_data["width"] or y >= self.map_data["height"]:
+            return
+        tile_layer = self.get_tile_layer(self.current_layer, create=True)
+        tiles = tile_layer.get_region(0, 0, tile_layer.width, tile_layer.height)
+        mask = flood_fill_mask(tiles, x, y)
+        
+        # Write only the bounding box of the filled area
+        rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        tile_id = self.map_data["palette"].id_for(self.selected_tile)
+        block = np.full((y1 - y0, x1 - x0), tile_id, dtype=TILE_DTYPE)
+        self.apply_block(int(x0), int(y0), block, mask[y0:y1, x0:x1])
+    
+    @profiled()
+    def apply_block(self, x: int, y: int, tiles: np.ndarray, mask: np.ndarray = None):
+        """Write a block of tile ids to the current layer, refresh it and announce it once"""
+        tile_layer = self.get_tile_layer(self.current_layer, create=True)
+        # Edits made outside a mouse stroke still get their own undo step
+        own_step = self.history.recorder is None
+        if own_step:
+            self.history.begin_stroke(self.current_layer, tile_layer)
+        changed = tile_layer.set_region(x, y, tiles, mask)
+        if own_step:
+            self.history.end_stroke()
+        if not changed:
+            return
+        h, w = tiles.shape
+        self.refresh_chunks(self.current_layer, changed, (x, y, w, h))
+        self.tiles_changed.emit(self.current_layer, x, y, w, h)
+    
     def wheelEvent(self, event: QWheelEvent):
         """Handle zoom with mouse wheel"""
         zoom_factor = 1.15
@@ -140,38 +383,123 @@ class MapViewport(QGraphicsView):
         self.resetTransform()
         self.scale(self.zoom_level, self.zoom_level)
     
+    def get_tile_layer(self, index: int, create: bool = False) -> TileLayer:
+        """Get the tile layer data for a layer index, creating missing layers on demand"""
+        tile_layers = self.map_data["layers"]
+        while create and index >= len(tile_layers):
+            tile_layers.append(TileLayer(
+                f"Layer {len(tile_layers)}",
+                self.map_data["width"], self.map_data["height"]
+            ))
+        if 0 <= index < len(tile_layers):
+            return tile_layers[index]
+        return None
+    
+    def refresh_tiles(self, layer_index: int, x: int, y: int, w: int, h: int):
+        """Patch cached chunks after an edit and repaint only the touched scene rect"""
+        tile_layer = self.get_tile_layer(layer_index)
+        if tile_layer is not None:
+            self.chunk_cache.patch_region(layer_index, tile_layer, x, y, w, h)
+        rect = QRectF(x * self.grid_size, y * self.grid_size, w * self.grid_size, h * self.grid_size)
+        self.invalidateScene(rect, QGraphicsScene.SceneLayer.BackgroundLayer)
+    
+    @profiled()
     def place_tile(self, x: int, y: int, tile_id: str):
         """Place a tile on the map"""
         if x < 0 or y < 0 or x >= self.map_data["width"] or y >= self.map_data["height"]:
             return
         
-        # Remove existing tile at position
-        self.erase_tile(x, y, silent=True)
-        
-        # Add new tile (placeholder - would use actual tile pixmap)
-        rect_item = self.scene.addRect(
-            x * self.grid_size, y * self.grid_size,
-            self.grid_size, self.grid_size,
-            QPen(Qt.PenStyle.NoPen), QBrush(QColor(100, 150, 200))
-        )
-        rect_item.setZValue(self.current_layer)
-        
-        if self.current_layer < len(self.layers):
-            self.layers[self.current_layer].addToGroup(rect_item)
+        tile_layer = self.get_tile_layer(self.current_layer, create=True)
+        new_id = self.map_data["palette"].id_for(tile_id)
+        if self.set_cell(tile_layer, x, y, new_id) == new_id:
+            return
         
+        self.refresh_tiles(self.current_layer, x, y, 1, 1)
         self.tile_placed.emit(x, y, tile_id)
     
+    @profiled()
     def erase_tile(self, x: int, y: int, silent: bool = False):
         """Remove tile at position"""
-        items = self.scene.items(
-            x * self.grid_size, y * self.grid_size,
-            self.grid_size, self.grid_size,
-            Qt.ItemSelectionMode.ContainsShape
-        )
-        
-        for item in items:
-            if isinstance(item, type(self.scene.addRect(0,0,1,1))):
-                self.scene.removeItem(item)
+        tile_layer = self.get_tile_layer(self.current_layer)
+        if tile_layer is None:
+            return
+        
+        if self.set_cell(tile_layer, x, y, EMPTY_TILE) != EMPTY_TILE:
+            self.refresh_tiles(self.current_layer, x, y, 1, 1)
+    
+    def set_cell(self, tile_layer, x: int, y: int, tile_id: int) -> int:
+        """Set one cell of the current layer, as its own undo step outside a stroke; returns the old id"""
+        own_step = self.history.recorder is None
+        if own_step:
+            self.history.begin_stroke(self.current_layer, tile_layer)
+        old_id = tile_layer.set(x, y, tile_id)
+        if own_step:
+            self.history.end_stroke()
+        return old_id
+    
+    @profiled()
+    def undo(self):
+        """Undo the last tile edit"""
+        if self.map_data:
+            self.apply_history(self.history.undo(self.map_data["layers"]))
+    
+    @profiled()
+    def redo(self):
+        """Redo the last undone tile edit"""
+        if self.map_data:
+            self.apply_history(self.history.redo(self.map_data["layers"]))
+    
+    def apply_history(self, result):
+        if result is None:
+            return
+        layer_index, chunks = result
+        self.refresh_chunks(layer_index, chunks)
+        
+        tile_layer = self.get_tile_layer(layer_index)
+        cs = tile_layer.chunk_size
+        x0, y0 = min(c[0] for c in chunks) * cs, min(c[1] for c in chunks) * cs
+        x1 = min((max(c[0] for c in chunks) + 1) * cs, tile_layer.width)
+        y1 = min((max(c[1] for c in chunks) + 1) * cs, tile_layer.height)
+        self.tiles_changed.emit(layer_index, x0, y0, x1 - x0, y1 - y0)
+    
+    def refresh_chunks(self, layer_index: int, chunks, rect=None):
+        """Refresh changed chunks, patching small edits and re-rendering large ones lazily"""
+        if rect is not None and rect[2] * rect[3] <= PATCH_CELLS:
+            self.refresh_tiles(layer_index, *rect)
+            return
+        
+        tile_layer = self.get_tile_layer(layer_index)
+        span = tile_layer.chunk_size * self.grid_size
+        dirty = QRectF()
+        for cx, cy in chunks:
+            self.chunk_cache.discard_chunk(layer_index, cx, cy)
+            dirty = dirty.united(QRectF(cx * span, cy * span, span, span))
+        self.invalidateScene(dirty, QGraphicsScene.SceneLayer.BackgroundLayer)
+    
+    def set_layer_visible(self, layer_index: int, visible: bool):
+        """Show or hide a layer"""
+        tile_layer = self.get_tile_layer(layer_index)
+        if tile_layer is not None:
+            tile_layer.visible = visible
+            self.invalidateScene(self.sceneRect(), QGraphicsScene.SceneLayer.BackgroundLayer)
+    
+    def select_entity_at(self, scene_pos: QPointF):
+        """Hit-test entities near a scene position through the spatial index"""
+        hits = self.map_data["entities"].query_point(scene_pos.x(), scene_pos.y(), self.grid_size / 2)
+        if hits:
+            self.entity_selected.emit(hits[0].id)
+    
+    def set_tool(self, tool: str):
+        """Switch the active tool, closing any stroke in progress"""
+        self.flush_stroke()
+        self.history.end_stroke()
+        self.stroke_last = self.drag_origin = self.drag_current = None
+        self.current_tool = tool
+        self.draw_grid()
+    
+    def set_brush_size(self, size: int):
+        """Set the diameter in cells of the paint and erase brush"""
+        self.brush_size = max(1, size)
     
     def set_current_layer(self, layer_index: int):
         """Set the active layer for painting"""
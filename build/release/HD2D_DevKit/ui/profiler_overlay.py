@@ -0,0 +1,69 @@
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtCore import Qt, QTimer
+from core.profiler import PROFILER
+
+def hit_rate(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{100 * hits / total:.0f}% of {total}" if total else "-"
+
+class ProfilerOverlay(QLabel):
+    """Frame time, scene item count and cache hit rates shown over the map viewport"""
+    
+    def __init__(self, map_viewport, tile_manager=None):
+        # Parented to the view rather than its viewport so scrolling does not move it
+        super().__init__(map_viewport)
+        self.map_viewport = map_viewport
+        self.tile_manager = tile_manager
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 170); color: #a0f0a0; "
+            "font-family: monospace; padding: 4px;"
+        )
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(250)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+    
+    def set_active(self, active: bool):
+        """Show the overlay and collect timings, or stop both"""
+        PROFILER.enabled = active
+        if active:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.hide()
+    
+    def refresh(self):
+        report = PROFILER.report()
+        frame = report.get("MapViewport.frame")
+        if frame:
+            lines = [f"Frame   {PROFILER.last('MapViewport.frame') * 1000:6.2f} ms  "
+                     f"p95 {frame['p95_ms']:.2f}  max {frame['max_ms']:.2f}"]
+        else:
+            lines = ["Frame   -"]
+        
+        cache = self.map_viewport.chunk_cache
+        lines.append(f"Items   {len(self.map_viewport.scene.items())}")
+        lines.append(f"Chunks  {hit_rate(cache.hits, cache.misses)} hits, "
+                     f"{cache.used_bytes / (1024 * 1024):.0f} MB "
+                     f"({cache.table_bytes / (1024 * 1024):.0f} MB tile tables)")
+        if self.tile_manager is not None:
+            tiles = self.tile_manager.tiles
+            lines.append(f"Tiles   {hit_rate(tiles.hits, tiles.misses)} hits, "
+                         f"{tiles.used_bytes / (1024 * 1024):.0f} MB")
+        
+        # Slowest editor operation so far, painting aside
+        edits = [(name, stats) for name, stats in report.items() if not name.startswith("MapViewport.draw")
+                 and name != "MapViewport.frame"]
+        if edits:
+            name, stats = max(edits, key=lambda item: item[1]["max_ms"])
+            lines.append(f"Slowest {name} {stats['max_ms']:.1f} ms")
+        
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        viewport = self.map_viewport.viewport().geometry()
+        self.move(viewport.left() + 8, viewport.top() + 8)
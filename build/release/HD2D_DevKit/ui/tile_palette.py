@@ -1,15 +1,47 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QListWidget,
-                           QListWidgetItem, QPushButton, QComboBox, QLabel)
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QPixmap, QIcon
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QListView,
+                           QPushButton, QComboBox, QLabel)
+from PyQt6.QtCore import Qt, QSize, QModelIndex, QAbstractListModel, pyqtSignal
+from PyQt6.QtGui import QPixmap, QPixmapCache, QIcon
 from core.tile_manager import TileManager
 
+class TileListModel(QAbstractListModel):
+    """List model that cuts tile icons only when the view asks for them"""
+    
+    def __init__(self, tile_manager: TileManager, tile_ids: list, cache_prefix: str):
+        super().__init__()
+        self.tile_manager = tile_manager
+        self.tile_ids = tile_ids
+        self.cache_prefix = cache_prefix  # file hash, so edited tilesets never reuse stale icons
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tile_ids)
+    
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        tile_id = self.tile_ids[index.row()]
+        if role == Qt.ItemDataRole.UserRole:
+            return tile_id
+        if role == Qt.ItemDataRole.DecorationRole:
+            cache_key = f"{self.cache_prefix}:{tile_id}"
+            pixmap = QPixmapCache.find(cache_key)
+            if pixmap is None:
+                tile = self.tile_manager.get_tile_by_id(tile_id)
+                if tile is None:
+                    return None
+                pixmap = QPixmap.fromImage(tile)
+                QPixmapCache.insert(cache_key, pixmap)
+            return QIcon(pixmap)
+        return None
+
 class TilePalette(QWidget):
     tile_selected = pyqtSignal(str)
+    tileset_loaded = pyqtSignal(str)  # a tileset was registered or its file changed
     
     def __init__(self):
         super().__init__()
         self.tile_manager = TileManager()
+        self.models = {}  # tileset filename -> TileListModel, so switching back is instant
         self.init_ui()
     
     def init_ui(self):
@@ -29,11 +61,14 @@ class TilePalette(QWidget):
         layout.addLayout(tileset_layout)
         
         # Tile list
-        self.tile_list = QListWidget()
-        self.tile_list.setViewMode(QListWidget.ViewMode.IconMode)
-        self.tile_list.setIconSize(64, 64)
-        self.tile_list.setGridSize(80, 80)
-        self.tile_list.itemClicked.connect(self.on_tile_selected)
+        self.tile_list = QListView()
+        self.tile_list.setViewMode(QListView.ViewMode.IconMode)
+        self.tile_list.setIconSize(QSize(64, 64))
+        self.tile_list.setGridSize(QSize(80, 80))
+        self.tile_list.setUniformItemSizes(True)
+        self.tile_list.setLayoutMode(QListView.LayoutMode.Batched)
+        self.tile_list.setResizeMode(QListView.ResizeMode.Adjust)
+        self.tile_list.clicked.connect(self.on_tile_selected)
         layout.addWidget(self.tile_list)
         
         # Load tilesets button
@@ -61,14 +96,15 @@ class TilePalette(QWidget):
         
         path = f"assets/tiles/{filename}"
         # Assume 32px tiles by default - could add UI to configure
-        tiles = self.tile_manager.load_tileset(filename, path, 32)
+        tile_ids = self.tile_manager.load_tileset(filename, path, 32)
         
-        self.tile_list.clear()
-        for tile_id, qimage in tiles.items():
-            pixmap = QPixmap.fromImage(qimage)
-            item = QListWidgetItem(QIcon(pixmap), "")
-            item.setData(Qt.ItemDataRole.UserRole, tile_id)
-            self.tile_list.addItem(item)
+        model = self.models.get(filename)
+        if model is None or model.tile_ids is not tile_ids:
+            cache_key = self.tile_manager.tilesets[filename]["cache_key"]
+            model = TileListModel(self.tile_manager, tile_ids, cache_key)
+            self.models[filename] = model
+            self.tileset_loaded.emit(filename)
+        self.tile_list.setModel(model)
     
     def load_new_tileset(self):
         """Open file dialog to load new tileset"""
@@ -83,7 +119,7 @@ class TilePalette(QWidget):
             shutil.copy(file_path, f"assets/tiles/{filename}")
             self.scan_tilesets()
     
-    def on_tile_selected(self, item: QListWidgetItem):
+    def on_tile_selected(self, index: QModelIndex):
         """Emit signal when tile is selected"""
-        tile_id = item.data(Qt.ItemDataRole.UserRole)
+        tile_id = index.data(Qt.ItemDataRole.UserRole)
         self.tile_selected.emit(tile_id)
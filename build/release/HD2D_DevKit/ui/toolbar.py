@@ -1,9 +1,12 @@
-from PyQt6.QtWidgets import QToolBar, QComboBox, QAction, QButtonGroup
-from PyQt6.QtGui import QIcon
+from PyQt6.QtWidgets import QToolBar, QComboBox
+from PyQt6.QtGui import QIcon, QActionGroup
 from PyQt6.QtCore import pyqtSignal
 
+BRUSH_SIZES = [1, 2, 3, 5, 8, 13]
+
 class EditorToolbar(QToolBar):
     tool_changed = pyqtSignal(str)
+    brush_size_changed = pyqtSignal(int)
     
     def __init__(self):
         super().__init__("Tools")
@@ -11,8 +14,9 @@ class EditorToolbar(QToolBar):
     
     def init_ui(self):
         # Tool selection group
-        self.tool_group = QButtonGroup(self)
-        self.tool_group.buttonClicked.connect(self.on_tool_selected)
+        self.tool_group = QActionGroup(self)
+        self.tool_group.setExclusive(True)
+        self.tool_group.triggered.connect(self.on_tool_selected)
         
         # Paint tool
         self.paint_action = self.addAction(QIcon("assets/icons/paint.png"), "Paint (P)")
@@ -27,6 +31,29 @@ class EditorToolbar(QToolBar):
         self.select_action = self.addAction(QIcon("assets/icons/select.png"), "Select (S)")
         self.select_action.setCheckable(True)
         
+        # Bulk tools
+        self.fill_action = self.addAction(QIcon("assets/icons/fill.png"), "Fill (F)")
+        self.fill_action.setCheckable(True)
+        
+        self.rect_action = self.addAction(QIcon("assets/icons/rect.png"), "Rectangle (R)")
+        self.rect_action.setCheckable(True)
+        
+        self.ellipse_action = self.addAction(QIcon("assets/icons/ellipse.png"), "Ellipse (O)")
+        self.ellipse_action.setCheckable(True)
+        
+        self.stamp_action = self.addAction(QIcon("assets/icons/stamp.png"), "Stamp (T) - Shift+drag to copy")
+        self.stamp_action.setCheckable(True)
+        
+        for action in (self.paint_action, self.erase_action, self.select_action,
+                       self.fill_action, self.rect_action, self.ellipse_action, self.stamp_action):
+            self.tool_group.addAction(action)
+        
+        # Brush size
+        self.brush_size = QComboBox()
+        self.brush_size.addItems([str(size) for size in BRUSH_SIZES])
+        self.brush_size.currentTextChanged.connect(lambda text: self.brush_size_changed.emit(int(text)))
+        self.addWidget(self.brush_size)
+        
         self.addSeparator()
         
         # Zoom controls
@@ -39,7 +66,11 @@ class EditorToolbar(QToolBar):
         tool_map = {
             self.paint_action: "paint",
             self.erase_action: "erase",
-            self.select_action: "select"
+            self.select_action: "select",
+            self.fill_action: "fill",
+            self.rect_action: "rect",
+            self.ellipse_action: "ellipse",
+            self.stamp_action: "stamp"
         }
         tool = tool_map.get(action, "paint")
         self.tool_changed.emit(tool)